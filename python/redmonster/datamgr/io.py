@@ -8,11 +8,92 @@
 import numpy as n
 from astropy.io import fits
 from os import environ, makedirs, getcwd, remove
-from os.path import exists, join, basename
+from os.path import exists, join, basename, splitext
 from astropy.io import fits
 from time import gmtime, strftime
 from glob import iglob
 import re
+from io import BytesIO
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fitsio
+    _HAS_FITSIO = True
+except ImportError:
+    _HAS_FITSIO = False
+
+
+@lru_cache(maxsize=1024)
+def _axkeys(prefix, ax, npix):
+    """
+    Per-pixel ndArch header keywords (e.g. 'PV2_1', ..., 'PV2_npix') for
+    FITS axis string ax.  Cached, since archetype libraries share shapes.
+    """
+    return tuple('%s%s_%d' % (prefix, ax, j+1) for j in range(npix))
+
+@lru_cache(maxsize=1024)
+def _axcomments(what, ax, npix):
+    """
+    Comments for the per-pixel ndArch header keywords of _axkeys, e.g.
+    'Axis 2 value at pixel 1'.  Cached for the same reason.
+    """
+    return tuple('Axis %s %s at pixel %d' % (ax, what, j+1) for j in range(npix))
+
+def _parse_axes(hdr_map, shape):
+    """
+    Construct the parameter baselines of an ndArch file from its header.
+
+    hdr_map is a dictionary of header keyword -> value, and shape is
+    the shape of the parameter axes (N_0, N_1,...,N_(npar-1)).
+
+    Returns the tuple:
+    (baselines, par_axistype, par_names, par_units)
+
+    with entries as described for read_ndArch.
+    """
+    npars = len(shape)
+    par_names = ['']*npars
+    par_units = ['']*npars
+    par_axistype = ['index']*npars
+    baselines = [None] * npars
+    # Loop over parameters and construct baselines:
+    for ipar in range(npars):
+        # Translate Python axis index integer to FITS axis index string:
+        ax = str(npars + 1 - ipar)
+        npix = shape[ipar]
+        # Populate name & units for this axis, if available:
+        if ('CNAME'+ax in hdr_map): par_names[ipar] = hdr_map['CNAME'+ax]
+        if ('CUNIT'+ax in hdr_map): par_units[ipar] = hdr_map['CUNIT'+ax]
+        # Axis condition tests are evaluated in order of precedence, and
+        # only until one of them matches:
+        pv_base = _axkeys('PV', ax, npix)
+        ps_base = _axkeys('PS', ax, npix)
+        n_base = _axkeys('N', ax, npix)
+        if ('CRPIX'+ax in hdr_map) and ('CRVAL'+ax in hdr_map) and \
+                ('CDELT'+ax in hdr_map):
+            # Fold the reference pixel into a single offset and scale one
+            # buffer in place, rather than building temporaries per term:
+            cdelt = hdr_map['CDELT'+ax]
+            start = (1 - hdr_map['CRPIX'+ax]) * cdelt + hdr_map['CRVAL'+ax]
+            baselines[ipar] = n.arange(npix,
+                                       dtype=n.result_type(int, start, cdelt))
+            baselines[ipar] *= cdelt
+            baselines[ipar] += start
+            par_axistype[ipar] = 'regular'
+        elif all(this_pv in hdr_map for this_pv in pv_base):
+            baselines[ipar] = n.fromiter((hdr_map[this_pv] for this_pv in pv_base),
+                                         dtype=float, count=npix)
+            par_axistype[ipar] = 'irregular'
+        elif all(this_ps in hdr_map for this_ps in ps_base):
+            baselines[ipar] = n.asarray([hdr_map[this_ps] for this_ps in ps_base])
+            par_axistype[ipar] = 'labeled'
+        elif all(this_n in hdr_map for this_n in n_base):
+            baselines[ipar] = n.asarray([hdr_map[this_n] for this_n in n_base])
+            par_axistype[ipar] = 'named'
+        else:
+            # Default to a one-based index:
+            baselines[ipar] = n.arange(1, npix+1, dtype=n.int32)
+    return baselines, par_axistype, par_names, par_units
 
 def read_ndArch(fname):
     """
@@ -55,60 +136,36 @@ def read_ndArch(fname):
     fn_ROOT = fname[:fname.rfind('.fits')]
     fn_CLASS = fn_ROOT.split('-')[-2]
     fn_VERSION = fn_ROOT.split('-')[-1]
-    # Get the data and header:
-    data = fits.getdata(fname).copy()
-    header = fits.getheader(fname)
+    # Get the data and a header keyword -> value map (so the per-pixel
+    # tests and lookups below don't rescan the card list every time) from
+    # a single open of the file, using fitsio if it is installed:
+    if _HAS_FITSIO:
+        with fitsio.FITS(fname) as hdul:
+            data = hdul[0].read()
+            hdr_map = dict((rec['name'], rec['value']) for rec in
+                           hdul[0].read_header().records())
+    else:
+        with fits.open(fname, memmap=True) as hdul:
+            header = hdul[0].header
+            data = hdul[0].data
+        hdr_map = dict((card.keyword, card.value) for card in header.cards)
     # Identify how many parameters:
     npars = len(data.shape) - 1
-    emptyparlist = ['']
+    # Parse the parameter axes:
+    baselines, par_axistype, par_names, par_units = \
+        _parse_axes(hdr_map, data.shape[:-1])
     # Initialize output info dictionary:
     infodict = {'filename': fname.split('/')[-1],
         'class': fn_CLASS,
         'version': fn_VERSION,
-        'coeff0': header['CRVAL1'],
-        'coeff1': header['CDELT1'],
-        'nwave': header['NAXIS1'],
+        'coeff0': hdr_map['CRVAL1'],
+        'coeff1': hdr_map['CDELT1'],
+        'nwave': hdr_map['NAXIS1'],
         'fluxunit': '',
-        'par_names': ['']*npars,
-        'par_units': ['']*npars,
-        'par_axistype': ['index']*npars}
-    if ('BUNIT' in header): infodict['fluxunit'] = header['BUNIT']
-    # Initialize list of baselines with index defaults:
-    baselines = [n.arange(this_size)+1 for this_size in data.shape[:-1]]
-    # Loop over parameters and construct baselines:
-    for ipar in range(npars):
-        # Translate Python axis index integer to FITS axis index string:
-        ax = str(npars + 1 - ipar)
-        # Populate name & units for this axis, if available:
-        if ('CNAME'+ax in header): infodict['par_names'][ipar] = header['CNAME'+ax]
-        if ('CUNIT'+ax in header): infodict['par_units'][ipar] = header['CUNIT'+ax]
-        # The axis condition tests -- maybe inefficient to always compute
-        # all of these, but makes for nicer code:
-        is_regular = ('CRPIX'+ax in header) and \
-            ('CRVAL'+ax in header) and \
-            ('CDELT'+ax in header)
-        pv_base = ['PV'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-        pv_test = n.asarray([this_pv in header for this_pv in pv_base])
-        is_irregular = pv_test.prod() > 0
-        ps_base = ['PS'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-        ps_test = n.asarray([this_ps in header for this_ps in ps_base])
-        is_labeled = ps_test.prod() > 0
-        n_base = ['N'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-        n_test = n.asarray([this_n in header for this_n in n_base])
-        is_named = n_test.prod() > 0
-        if is_regular:
-            baselines[ipar] = (n.arange(data.shape[ipar]) + 1 - header['CRPIX'+ax]) \
-                * header['CDELT'+ax] + header['CRVAL'+ax]
-            infodict['par_axistype'][ipar] = 'regular'
-        elif is_irregular:
-            baselines[ipar] = n.asarray([header[this_pv] for this_pv in pv_base])
-            infodict['par_axistype'][ipar] = 'irregular'
-        elif is_labeled:
-            baselines[ipar] = n.asarray([header[this_ps] for this_ps in ps_base])
-            infodict['par_axistype'][ipar] = 'labeled'
-        elif is_named:
-            baselines[ipar] = n.asarray([header[this_n] for this_n in n_base])
-            infodict['par_axistype'][ipar] = 'named'
+        'par_names': par_names,
+        'par_units': par_units,
+        'par_axistype': par_axistype}
+    if ('BUNIT' in hdr_map): infodict['fluxunit'] = hdr_map['BUNIT']
     return data, baselines, infodict
 
 # write_ndArch.py
@@ -177,26 +234,25 @@ def write_ndArch(data, baselines, infodict):
                                                      comment='Axis ' + ax + ' name')
         if ('par_units' in infodict): hdu.header.set('CUNIT'+ax, value=infodict['par_units'][ipar],
                                                      comment='Axis ' + ax + ' unit')
-        # Parse the various possibilities for the baselines:
+        # Parse the various possibilities for the baselines.
+        # Per-pixel keywords go in with one extend() per axis, rather than
+        # a set() (and header rescan) per pixel:
         if (infodict['par_axistype'][ipar].strip() == 'regular'):
             hdu.header.set('CRPIX'+ax, value=1.0, comment='Axis '+ax+' reference pixel')
             hdu.header.set('CRVAL'+ax, value=baselines[ipar][0], comment='Axis '+ax+' reference value')
             hdu.header.set('CDELT'+ax, value=(baselines[ipar][1]-baselines[ipar][0]), comment='Axis '+ax+' increment')
         elif (infodict['par_axistype'][ipar].strip() == 'irregular'):
-            pv_base = ['PV'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-            for j in range(data.shape[ipar]): hdu.header.set(pv_base[j], value=baselines[ipar][j],
-                                                              comment='Axis '+ax+' value at pixel ' + str(j+1))
+            hdu.header.extend(zip(_axkeys('PV', ax, data.shape[ipar]), baselines[ipar],
+                                  _axcomments('value', ax, data.shape[ipar])))
         elif (infodict['par_axistype'][ipar].strip() == 'labeled'):
-            ps_base = ['PS'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-            for j in range(data.shape[ipar]): hdu.header.set(ps_base[j], value=baselines[ipar][j],
-                                                              comment='Axis '+ax+' label at pixel ' + str(j+1))
+            hdu.header.extend(zip(_axkeys('PS', ax, data.shape[ipar]), baselines[ipar],
+                                  _axcomments('label', ax, data.shape[ipar])))
         elif (infodict['par_axistype'][ipar].strip() == 'named'):
-            n_base = ['N'+ax+'_'+str(j+1) for j in range(data.shape[ipar])]
-            for j in range(data.shape[ipar]): hdu.header.set(n_base[j], value=baselines[ipar][j],
-                                                              comment='Axis '+ax+' name at pixel ' + str(j+1))
+            hdu.header.extend(zip(_axkeys('N', ax, data.shape[ipar]), baselines[ipar],
+                                  _axcomments('name', ax, data.shape[ipar])))
         else:
             pass
-    hdu.writeto(infodict['filename'], overwrite=True)
+    _writeto(hdu, infodict['filename'], overwrite=True)
 
 
 # Write output files after running entirety of redmonster
@@ -204,6 +260,27 @@ def write_ndArch(data, baselines, infodict):
 # Tim Hutchinson, University of Utah, August 2014
 # t.hutchinson@utah.edu
 
+def _str_col(name, strings):
+    '''
+    Fixed-width string fits.Column, sized to the longest entry of strings.
+    '''
+    strings = list(strings)
+    maxlen = max([len(x) for x in strings] or [1])
+    return fits.Column(name=name, format='%iA'%maxlen, array=n.asarray(strings))
+
+def _writeto(hdulist, path, overwrite=False):
+    '''
+    Serialize hdulist (or a single HDU) in memory and write it to path in a single call,
+    rather than letting astropy issue many small writes (slow on
+    Lustre-type filesystems).
+    '''
+    if exists(path) and not overwrite:
+        raise IOError('File %r already exists.' % path)
+    buf = BytesIO()
+    hdulist.writeto(buf)
+    with open(path, 'wb') as f:
+        f.write(buf.getvalue())
+
 class WriteRedmonster:
     '''
     Class to write output file at the end of running redmonster.  
@@ -235,9 +312,9 @@ class WriteRedmonster:
                 except:
                     self.dest = None
         else:
-            bsr = environ['REDMONSTER_SPECTRO_REDUX']
-            run2d = environ['RUN2D']
-            run1d = environ['RUN1D']
+            bsr = environ.get('REDMONSTER_SPECTRO_REDUX')
+            run2d = environ.get('RUN2D')
+            run1d = environ.get('RUN1D')
             if bsr and run2d and run1d:
                 testpath = join(bsr, run2d, '%s' % zpick.plate, run1d)
                 if exists(testpath):
@@ -250,10 +327,12 @@ class WriteRedmonster:
                         self.dest = None
             else: self.dest = None
 
-    def create_hdulist(self):
+    def create_hdulist(self, date=None):
+        # date is the DATE_RM timestamp; defaults to now
+        if date is None: date = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
         # Get old header, append new stuff
         hdr = self.zpick.hdr
-        hdr.extend([('VERS_RM',self.version,'Version of redmonster used'),('DATE_RM',strftime("%Y-%m-%d_%H:%M:%S", gmtime()),'Time of redmonster completion'), ('NFIBERS', self.zpick.z.shape[0], 'Number of fibers')])
+        hdr.extend([('VERS_RM',self.version,'Version of redmonster used'),('DATE_RM',date,'Time of redmonster completion'), ('NFIBERS', self.zpick.z.shape[0], 'Number of fibers')])
         prihdu = fits.PrimaryHDU(header=self.zpick.hdr)
         # Columns for 1st BIN table
         col1 = fits.Column(name='Z1', format='E', array=self.zpick.z[:,0])
@@ -270,29 +349,23 @@ class WriteRedmonster:
         col4_3 = fits.Column(name='Z_ERR4', format='E', array=self.zpick.z_err[:,3])
         col4_4 = fits.Column(name='Z_ERR5', format='E', array=self.zpick.z_err[:,4])
         '''
-        classx = n.array(list(map(repr,self.zpick.type)))
-        maxlen = max(list(map(len,classx)))
-        col5 = fits.Column(name='CLASS', format='%iA'%maxlen, array=self.zpick.type)
+        col5 = _str_col('CLASS', self.zpick.type)
         # Change dictionary values of subclass to strings to be written into fits file.  eval('dictstring') will turn them back into dictionaries later.
         if type(self.zpick.subtype[0]) is not dict: # Skip this and write directly if these are already dicts
-            subclass = n.array(list(map(repr,self.zpick.subtype)))
+            subclass = [repr(x) for x in self.zpick.subtype]
         else:
-            subclass = n.array(self.zpick.subtype)
-        maxlen = max(list(map(len,subclass)))
-        col6 = fits.Column(name='SUBCLASS', format='%iA'%maxlen, array=subclass)
+            subclass = self.zpick.subtype
+        col6 = _str_col('SUBCLASS', subclass)
         col7 = fits.Column(name='FIBERID', format='J', array=self.zpick.fiberid)
         if type(self.zpick.minvector[0]) is not str:
-            minvec = n.array(list(map(repr,self.zpick.minvector))) # Change tuples of minvector to strings to be written into fits file. eval('minvector') will turn them back into tuples later.
+            minvec = [repr(x) for x in self.zpick.minvector] # Change tuples of minvector to strings to be written into fits file. eval('minvector') will turn them back into tuples later.
         else:
-            minvec = n.array(self.zpick.minvector)
-        maxlen = max(list(map(len,minvec)))
-        col8 = fits.Column(name='MINVECTOR', format='%iA'%maxlen, array=minvec)
+            minvec = self.zpick.minvector
+        col8 = _str_col('MINVECTOR', minvec)
         col9 = fits.Column(name='ZWARNING', format='E', array=list(map(int,self.zpick.zwarning)))
         col10 = fits.Column(name='DOF', format='E', array=self.zpick.dof)
         col11 = fits.Column(name='NPOLY', format='E', array=self.zpick.npoly)
-        fname = n.array(list(map(repr,self.zpick.fname)))
-        maxlen = max(list(map(len,fname)))
-        col12 = fits.Column(name='FNAME', format='%iA'%maxlen, array=fname)
+        col12 = _str_col('FNAME', [repr(x) for x in self.zpick.fname])
         col13 = fits.Column(name='NPIXSTEP', format='E', array=self.zpick.npixstep)
         col14 = fits.Column(name='RCHI2DIFF', format='E', array=self.zpick.chi2diff)
         try:
@@ -319,60 +392,51 @@ class WriteRedmonster:
         self.thdulist = fits.HDUList([prihdu, tbhdu, sechdu]) #self.thdulist = fits.HDUList([prihdu, tbhdu])
     
 
-    def write_fiberid(self):
-        self.create_hdulist()
+    def _resolve(self, filename, ts):
+        '''
+        Full output path for filename, in self.dest or else the current
+        directory.  Unless overwriting, an existing file is left alone and
+        timestamp ts is appended to the new filename instead.
+        '''
+        path = join(self.dest if self.dest is not None else getcwd(), filename)
+        if self.overwrite or not exists(path):
+            return path
+        root, ext = splitext(path)
+        return '%s-%s%s' % (root, ts, ext)
 
-        if self.overwrite:
-            if self.dest is not None:
-                self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])), overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])))
-            else:
-                self.thdulist.writeto('redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0]), overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd) ))
-        else:
-            if self.dest is not None:
-                if exists(join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0]))):
-                    self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0], strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                    print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0], strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])))
-                    print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])))
-            else:
-                if exists('redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])):
-                    self.thdulist.writeto('redmonster-%s-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0], strftime("%Y-%m-%d_%H:%M:%S", gmtime())))
-                    print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0], strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto('redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0]))
-                    print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0])))
+    def write_fiberid(self):
+        # One timestamp for both DATE_RM and any timestamped filename
+        ts = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
+        self.create_hdulist(ts)
+        path = self._resolve('redmonster-%s-%s-%03d.fits' % (self.zpick.plate, self.zpick.mjd, self.zpick.fiberid[0]), ts)
+        _writeto(self.thdulist, path, overwrite=self.overwrite)
+        print('Writing redmonster file to %s' % path)
 
+    def write_plate(self):
+        # One timestamp for both DATE_RM and any timestamped filename
+        ts = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
+        self.create_hdulist(ts)
+        path = self._resolve('redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd), ts)
+        _writeto(self.thdulist, path, overwrite=self.overwrite)
+        print('Writing redmonster file to %s' % path)
 
 
-    def write_plate(self):
-        self.create_hdulist()
-        
-        if self.overwrite:
-            if self.dest is not None:
-                self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)), overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)))
-            else:
-                self.thdulist.writeto('redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd), overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd) ))
-        else:
-            if self.dest is not None:
-                if exists(join(self.dest, '%s' % 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd))):
-                    self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd, strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                    print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd, strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto(join(self.dest, '%s' % 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)))
-                    print('Writing redmonster file to %s' % join(self.dest, '%s' % 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)))
-            else:
-                if exists('redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)):
-                    self.thdulist.writeto('redmonster-%s-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd, strftime("%Y-%m-%d_%H:%M:%S", gmtime())))
-                    print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd, strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto('redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd))
-                    print('Writing redmonster file to %s' % join( getcwd(), 'redmonster-%s-%s.fits' % (self.zpick.plate, self.zpick.mjd)))
+# Fiber number of a single-fiber redmonster file, as written by
+# WriteRedmonster.write_fiberid (optionally with its timestamp suffix)
+_FIBER_RE = re.compile(r'-(\d{3})(?:-\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2})?\.fits$')
 
+def _read_fiber(path):
+    '''
+    Read a single-fiber redmonster file, returning (row, model): its
+    first table row, indexable by column name, and its first model row.
+    Only these are needed; fitsio reads just those rather than whole HDUs.
+    '''
+    if _HAS_FITSIO:
+        with fitsio.FITS(path) as hdu:
+            return hdu[1][0:1][0], hdu[2][0:1,:][0]
+    # Copy the rows out so no memory map outlives the with block.
+    with fits.open(path, memmap=True) as hdu:
+        return hdu[1].data[:1].copy()[0], hdu[2].data[0].copy()
 
 # Combine individual fiber fits files into a single plate file, or combine all plate files into an spAll-like file
 # To combine fiber files, create object for a given plate, mjd and call method merge_fibers()
@@ -405,51 +469,67 @@ class MergeRedmonster:
         self.models = None
         self.hdr = None
 
-        try: topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except: topdir = None
-        try: run2d = environ['RUN2D']
-        except: run2d = None
-        try: run1d = environ['RUN1D']
-        except: run1d = None
+        topdir = environ.get('REDMONSTER_SPECTRO_REDUX')
+        run2d = environ.get('RUN2D')
+        run1d = environ.get('RUN1D')
         fiberdir = join(topdir, run2d, '%s' % self.plate, run1d, 'redmonster-%s-%s-*.fits' % (self.plate, self.mjd)) if topdir and run2d and run1d else None
 
         if fiberdir:
             for path in iglob(fiberdir):
+                m = _FIBER_RE.search(basename(path))
+                if m is None: continue # e.g. a timestamped plate file
                 self.filepaths.append(path)
-                fiberfile = basename(path)
-                self.fiberid.append( int(fiberfile[22:25]) )
-            self.z = n.zeros( (len(self.fiberid),2) )
+                self.fiberid.append( int(m.group(1)) )
+            nfibers = len(self.fiberid)
+            self.z = n.zeros( (nfibers,2) )
             self.z_err = n.zeros( self.z.shape )
-            try: self.hdr = fits.open( join( environ['BOSS_SPECTRO_REDUX'], environ['RUN2D'], '%s' % self.plate, 'spPlate-%s-%s.fits' % (self.plate,self.mjd) ) )[0].header
-            except: self.hdr = fits.Header()
-            npix = fits.open( join( environ['BOSS_SPECTRO_REDUX'], environ['RUN2D'], '%s' % self.plate, 'spPlate-%s-%s.fits' % (self.plate,self.mjd) ) )[0].data.shape[1]
+            # Per-fiber columns are filled by index, rather than appended to
+            self.type = n.empty(nfibers, dtype=object)
+            self.subtype = n.empty(nfibers, dtype=object)
+            self.minvector = n.empty(nfibers, dtype=object)
+            self.fname = n.empty(nfibers, dtype=object)
+            self.zwarning = n.empty(nfibers, dtype=n.float32)
+            self.dof = n.empty(nfibers, dtype=n.float32)
+            self.npoly = n.empty(nfibers, dtype=n.float32)
+            self.npixstep = n.empty(nfibers, dtype=n.float32)
+            self.chi2diff = n.empty(nfibers, dtype=n.float32)
+            # One open of the spPlate gives both the header and npix (NAXIS1),
+            # without touching the image data:
+            spplate = join( environ['BOSS_SPECTRO_REDUX'], run2d, '%s' % self.plate, 'spPlate-%s-%s.fits' % (self.plate,self.mjd) )
+            with fits.open(spplate, memmap=True) as sp:
+                self.hdr = sp[0].header
+                npix = sp[0].header['NAXIS1']
             self.models = n.zeros( (self.z.shape[0],npix) )
             self.filepaths.sort()
             self.fiberid.sort()
-            for i, path in enumerate(self.filepaths):
-                hdu = fits.open(path)
-                self.z[i,0] = hdu[1].data.Z1[0]
-                self.z[i,1] = hdu[1].data.Z2[0]
-                self.z_err[i,0] = hdu[1].data.Z_ERR1[0]
-                self.z_err[i,1] = hdu[1].data.Z_ERR2[0]
-                self.type.append(hdu[1].data.CLASS[0])
-                self.subtype.append(hdu[1].data.SUBCLASS[0])
-                self.minvector.append(hdu[1].data.MINVECTOR[0])
-                self.zwarning.append(hdu[1].data.ZWARNING[0])
-                self.dof.append(hdu[1].data.DOF[0])
-                self.npoly.append(hdu[1].data.NPOLY[0])
-                self.fname.append(hdu[1].data.FNAME[0])
-                self.npixstep.append(hdu[1].data.NPIXSTEP[0])
-                self.chi2diff.append(hdu[1].data.CHI2DIFF[0])
+            # The reads are I/O bound, so overlap them across threads;
+            # map() hands results back in filepaths order.
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                fibers = list(pool.map(_read_fiber, self.filepaths))
+            for i, (row, model) in enumerate(fibers):
+                self.z[i,0] = row['Z1']
+                self.z[i,1] = row['Z2']
+                self.z_err[i,0] = row['Z_ERR1']
+                self.z_err[i,1] = row['Z_ERR2']
+                # str() so fitsio's numpy strings are written back as-is
+                self.type[i] = str(row['CLASS'])
+                self.subtype[i] = str(row['SUBCLASS'])
+                self.minvector[i] = str(row['MINVECTOR'])
+                self.zwarning[i] = row['ZWARNING']
+                self.dof[i] = row['DOF']
+                self.npoly[i] = row['NPOLY']
+                self.fname[i] = str(row['FNAME'])
+                self.npixstep[i] = row['NPIXSTEP']
+                self.chi2diff[i] = row['CHI2DIFF']
                 try:
-                    self.boss_target1.append(hdu[1].data.BOSS_TARGET1[0])
+                    self.boss_target1.append(row['BOSS_TARGET1'])
                 except:
                     pass
                 try:
-                    self.eboss_target1.append(hdu[1].data.EBOSS_TARGET1[0])
+                    self.eboss_target1.append(row['EBOSS_TARGET1'])
                 except:
                     pass
-                self.models[i] = hdu[2].data[0]
+                self.models[i] = model
                 #remove(path)
             output = WriteRedmonster(self, overwrite=True)
             output.write_plate()
@@ -472,12 +552,9 @@ class MergeRedmonster:
         self.models = n.zeros((1,1))
         self.hdr = fits.Header()
 
-        try: topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except: topdir = None
-        try: run2d = environ['RUN2D']
-        except: run2d = None
-        try: run1d = environ['RUN1D']
-        except: run1d = None
+        topdir = environ.get('REDMONSTER_SPECTRO_REDUX')
+        run2d = environ.get('RUN2D')
+        run1d = environ.get('RUN1D')
         platedir = join( topdir, run2d, '*') if topdir and run2d else None
 
         if platedir:
@@ -528,17 +605,14 @@ class MergeRedmonster:
 
         output = WriteRedmonster(self)
         output.create_hdulist()
-        output.thdulist.writeto( join( topdir, run2d, 'redmonsterAll-%s.fits' % run2d), overwrite=True)
+        _writeto(output.thdulist, join( topdir, run2d, 'redmonsterAll-%s.fits' % run2d), overwrite=True)
 
 
     def merge_chi2(self):
         
-        try: topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except: topdir = None
-        try: run2d = environ['RUN2D']
-        except: run2d = None
-        try: run1d = environ['RUN1D']
-        except: run1d = None
+        topdir = environ.get('REDMONSTER_SPECTRO_REDUX')
+        run2d = environ.get('RUN2D')
+        run1d = environ.get('RUN1D')
         chi2path = join( topdir, run2d, '%s' % self.plate, run1d, 'chi2arr-%s-%s-%s-*.fits' % (self.temp, self.plate, self.mjd) ) if topdir and run2d and run1d else None
         
         fiberid = []
@@ -568,7 +642,7 @@ class MergeRedmonster:
             cols = fits.ColDefs([col1])
             tbhdu = fits.BinTableHDU.from_columns(cols)
             thdulist = fits.HDUList([prihdu,tbhdu])
-            thdulist.writeto( join( topdir, run2d, '%s' % self.plate, run1d, 'chi2arr-%s-%s-%s.fits' % (self.temp, self.plate, self.mjd) ), overwrite=True)
+            _writeto(thdulist, join( topdir, run2d, '%s' % self.plate, run1d, 'chi2arr-%s-%s-%s.fits' % (self.temp, self.plate, self.mjd) ), overwrite=True)
 
 
 # ---------------------------------------------------------------------------------------------------------------
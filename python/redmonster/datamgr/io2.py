@@ -7,15 +7,31 @@
 
 
 import re
-from os import environ, makedirs, getcwd, remove
-from os.path import exists, join, basename, splitext
+from ast import literal_eval
+from io import BytesIO
+from os import environ, makedirs, getcwd, remove, scandir, fstat, pread
+from os.path import exists, join, basename, splitext, getsize
+from shutil import move
+from tempfile import TemporaryFile
 from time import gmtime, strftime
 
 import numpy as n
 from astropy.io import fits
 from glob import iglob
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 
 from redmonster._version import __version__
+try:
+    import fitsio
+    _HAS_FITSIO = True
+except ImportError:
+    _HAS_FITSIO = False
+try:
+    import h5py
+    _HAS_H5PY = True
+except ImportError:
+    _HAS_H5PY = False
 
 
 
@@ -219,6 +235,286 @@ def write_ndArch(data, baselines, infodict):
     hdu.writeto(infodict['filename'], overwrite=True)
 
 
+def _getenv(name):
+    '''
+    Value of environment variable name, or None (with a warning) if unset.
+    '''
+    value = environ.get(name)
+    if value is None:
+        print("Environmental variable %r is not set" % name)
+    return value
+
+
+def _writeto(hdulist, path, overwrite=False, output_verify='exception',
+             buffered=True):
+    '''
+    Write hdulist to path.  If $REDMONSTER_USE_FITSIO is set and fitsio is
+    installed, the file is written with fitsio, which avoids astropy's slow
+    table writes on Lustre-type filesystems; otherwise astropy writes it,
+    verified as output_verify says.  If buffered, the file is serialized
+    into memory first and written to disk in a single call; pass
+    buffered=False for files too large to hold in memory.
+    If $REDMONSTER_LOCALBUFF names a fast local directory (e.g. /dev/shm),
+    the file is staged there and then moved to path.
+    '''
+    if exists(path) and not overwrite:
+        raise IOError('File %r already exists.' % path)
+    localbuff = environ.get('REDMONSTER_LOCALBUFF')
+    target = join(localbuff, basename(path) + '.tmp') if localbuff else path
+    if environ.get('REDMONSTER_USE_FITSIO') and _HAS_FITSIO:
+        with fitsio.FITS(target, 'rw', clobber=True) as f:
+            for hdu in hdulist:
+                hdr = [{'name': card.keyword, 'value': card.value,
+                        'comment': card.comment} for card in hdu.header.cards]
+                if isinstance(hdu, fits.CompImageHDU):
+                    # Same quantization and one-spectrum tiles as _models_hdu
+                    f.write(n.asarray(hdu.data), header=hdr, compress='RICE',
+                            qlevel=_QUANTIZE_LEVEL,
+                            tile_dims=(1,)*(hdu.data.ndim-1) +
+                            (hdu.data.shape[-1],))
+                else:
+                    f.write(None if hdu.data is None else n.asarray(hdu.data),
+                            header=hdr)
+    elif buffered:
+        buf = BytesIO()
+        hdulist.writeto(buf, output_verify=output_verify)
+        with open(target, 'wb') as f:
+            f.write(buf.getbuffer())
+    else:
+        hdulist.writeto(target, overwrite=True, output_verify=output_verify)
+    if localbuff:
+        move(target, path)
+
+
+def _str_col(name, strings):
+    '''
+    fits.Column of strings, as wide as the longest one.  The width is
+    measured with n.char.str_len rather than read off the dtype, since a
+    column sliced out of a wider array keeps the wider dtype.
+    '''
+    strings = n.asarray(strings, dtype=str)
+    return fits.Column(name=name, format='%iA' % n.char.str_len(strings).max(),
+                       array=strings)
+
+
+_TFORM_DTYPES = {'J': '>i4', 'E': '>f4', 'D': '>f8'}
+
+
+def _table_hdu(fields, nrows):
+    '''
+    BinTableHDU built from (name, tform, array) fields by filling one
+    big-endian structured array, rather than converting and concatenating
+    a fits.Column per field.  tform is 'J', 'E' or 'D', repeated per row
+    for 2-d arrays; 'A' gives strings as wide as the longest.  Arrays
+    shorter than nrows are zero-padded, as BinTableHDU.from_columns does.
+    '''
+    # Strings are converted once, for both their width and their values
+    fields = [(name, tform, n.asarray(array, dtype=str) if tform == 'A'
+               else array) for name, tform, array in fields]
+    dtype = []
+    for name, tform, array in fields:
+        if tform == 'A':
+            width = max(n.char.str_len(array).max(), 1)
+            dtype.append( (name, 'S%i' % width) )
+        else:
+            # A repeat count of one is stored as a plain scalar column
+            shape = n.shape(array)[1:]
+            dtype.append( (name, _TFORM_DTYPES[tform]) +
+                          ((shape,) if shape != (1,) else ()) )
+    table = n.zeros(nrows, dtype=dtype)
+    for name, tform, array in fields:
+        column = table[name]
+        column[:len(array)] = n.reshape(array,
+                                        (len(array),) + column.shape[1:])
+    return fits.BinTableHDU(table)
+
+
+# Quantization level of RICE_1-compressed models
+_QUANTIZE_LEVEL = 16.
+
+
+def _models_hdu(models):
+    '''
+    ImageHDU of the model spectra.  If $REDMONSTER_COMPRESS_MODELS is set
+    they are instead RICE_1 tile-compressed (quantized float32, one tile
+    per spectrum so single fibers stay cheap to read).  Otherwise, if
+    $REDMONSTER_HALF_MODELS is set they are stored as 16-bit integers with
+    a min-max BSCALE/BZERO, a quarter of the bytes of float64.  Both lose
+    precision, so both are opt-in.
+    '''
+    if environ.get('REDMONSTER_COMPRESS_MODELS'):
+        models = n.asarray(models, dtype=n.float32)
+        return fits.CompImageHDU(data=models, compression_type='RICE_1',
+                                 quantize_level=_QUANTIZE_LEVEL,
+                                 tile_shape=(1,)*(models.ndim-1) +
+                                 (models.shape[-1],))
+    hdu = fits.ImageHDU(data=models)
+    if environ.get('REDMONSTER_HALF_MODELS'):
+        hdu.scale('int16', 'minmax')
+    return hdu
+
+
+def _scratch_array(shape, dtype=float):
+    '''
+    Zeroed array backed by an unlinked temporary file (in
+    $REDMONSTER_LOCALBUFF if set) rather than by memory, so filling it
+    does not grow the resident set: pages go back to disk as needed, and
+    writing it out streams from the mapping.
+    '''
+    if not n.prod(shape):
+        return n.zeros(shape, dtype=dtype)
+    with TemporaryFile(dir=environ.get('REDMONSTER_LOCALBUFF')) as f:
+        return n.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+
+def _pack_vectors(vectors, fill):
+    '''
+    Pack a sequence of ragged vectors (minvectors or theta tuples, or a
+    scalar flag such as -1 for a fiber with no spectrum) into a 2-D array,
+    padded with fill, for storage as a fixed-width numeric FITS column.
+    Returns the array and the length of each vector, -1 marking a scalar,
+    to be stored alongside so that unpack_vector gets back exactly what
+    was packed.  The array is at least one wide, even if every vector is
+    empty.
+    '''
+    lengths = n.array([len(v) if n.ndim(v) else -1 for v in vectors],
+                      dtype=int)
+    arr = n.full( (len(vectors), max(lengths.max(initial=1), 1)), fill )
+    for j, v in enumerate(vectors):
+        v = n.atleast_1d(v)
+        arr[j,:len(v)] = v
+    return arr, lengths
+
+
+def unpack_vector(value, length=None):
+    '''
+    Return a MINVECTOR or THETA entry of a redmonster file as a tuple, or
+    as a scalar if one was stored (e.g. -1 for a fiber with no spectrum).
+    length is the matching NMINVECTOR or NTHETA entry written by
+    _pack_vectors.  Files without those columns are also understood: for
+    padded numeric columns the padding is dropped, and repr() strings
+    written by older versions are evaluated.
+    '''
+    if isinstance(value, (str, bytes)):
+        return literal_eval(value.decode() if isinstance(value, bytes)
+                            else value)
+    value = n.atleast_1d(value)
+    if length is not None:
+        return value[0].item() if length < 0 else \
+                tuple(value[:length].tolist())
+    if value.dtype.kind == 'f':
+        value = value[~n.isnan(value)]
+    else:
+        value = value[value != -1]
+    return tuple(value.tolist())
+
+
+def _unpack_column(tbl, name):
+    '''
+    List of the unpacked entries of vector column name of table tbl,
+    using its N<name> length column when the file has one.
+    '''
+    lengths = tbl['N' + name] if 'N' + name in tbl.names else \
+            [None] * len(tbl)
+    return [unpack_vector(value, length) for value, length in
+            zip(tbl[name], lengths)]
+
+
+# Plate, mjd and, for a single-fiber file, fiber number of a redmonster
+# output file name, e.g. redmonster-3686-55268-005.fits
+_FILE_RE = re.compile(r'redmonster-(?P<plate>\d+)-(?P<mjd>\d+)'
+                      r'(?:-(?P<fiber>\d+))?\.fits$')
+
+
+def _by_fiberid(fiberid, paths):
+    '''
+    fiberid and paths, both sorted by integer fiberid.  Sorting the two
+    lists separately pairs the wrong files with fibers wherever the
+    numeric order differs from the lexical order of the names (999, 1000).
+    '''
+    order = n.argsort(fiberid, kind='stable')
+    return [fiberid[i] for i in order], [paths[i] for i in order]
+
+
+def _read_one_fiber(path):
+    '''
+    Read the single table row and model array of a per-fiber redmonster
+    file, for the merge methods to map over a thread pool; the row comes
+    back as a dict keyed by column name.  fitsio, if installed, reads just
+    that row and model slice.  Otherwise the file is mapped read-only
+    ('denywrite'), so nothing is buffered beyond the row and models
+    actually used, and array values are copied out of the mapping before
+    it is closed.  memmap is left at its default rather than forced on,
+    which would refuse to read BSCALE/BZERO-scaled models.
+    '''
+    if _HAS_FITSIO:
+        with fitsio.FITS(path) as hdu:
+            rec = hdu[1][0:1][0]
+            first = (slice(0, 1),) + (slice(None),) * \
+                    (len(hdu[2].get_dims()) - 1)
+            return dict(zip(rec.dtype.names, rec)), hdu[2][first][0]
+    with fits.open(path, mode='denywrite') as hdu:
+        tbl = hdu[1].data
+        row = dict((name, n.array(value) if isinstance(value, n.ndarray)
+                    else value) for name, value in zip(tbl.names, tbl[0]))
+        models = hdu[2].section[0]
+    return row, models
+
+
+def _read_chi2arr(path, out):
+    '''
+    Copy the data of the primary HDU of a per-fiber chi2 file into out.
+    fitsio is used if installed, as it skips building astropy's per-HDU
+    objects; otherwise the data are copied straight from a memory map of
+    the file, without an intermediate array.
+    '''
+    if _HAS_FITSIO:
+        out[...] = fitsio.read(path, ext=0).reshape(out.shape)
+        return out
+    # chi2 surfaces are written as plain floats, so skip the scaling checks
+    with fits.open(path, memmap=True, do_not_scale_image_data=True,
+                   uint=False, lazy_load_hdus=False) as hdu:
+        n.copyto(out, hdu[0].data.reshape(out.shape))
+    return out
+
+
+def _chi2_layout(path):
+    '''
+    (file size, data offset, on-disk dtype, shape) of the data of a chi2
+    file, for reading files written the same way with _pread_chi2arr.
+    '''
+    with fits.open(path, do_not_scale_image_data=True) as hdu:
+        return (getsize(path), hdu.fileinfo(0)['datLoc'], hdu[0].data.dtype,
+                hdu[0].shape)
+
+
+def _pread_chi2arr(path, out, layout):
+    '''
+    Read the data of a chi2 file into out with a single pread at the data
+    offset in layout, without parsing the header.  This relies on the file
+    being laid out like the one layout came from, so a file of any other
+    size is read by _read_chi2arr instead.
+    '''
+    size, offset, dtype, shape = layout
+    with open(path, 'rb', buffering=0) as f:
+        if fstat(f.fileno()).st_size != size:
+            return _read_chi2arr(path, out)
+        data = pread(f.fileno(), out.size * dtype.itemsize, offset)
+    out[...] = n.frombuffer(data, dtype=dtype).reshape(out.shape)
+    return out
+
+
+def _write_chi2_hdf5(path, chi2arrs, fiberid):
+    '''
+    Write a merged chi2 array and its fiberids to HDF5, LZF-compressed and
+    chunked one fiber per chunk to match how the surfaces are read back.
+    '''
+    with h5py.File(path, 'w') as f:
+        f.create_dataset('chi2', data=chi2arrs,
+                         chunks=(1,) + chi2arrs.shape[1:], compression='lzf')
+        f.create_dataset('fiberid', data=n.asarray(fiberid, dtype=n.int32))
+
+
 class WriteRedmonster:
     '''
         Class to write output file at the end of running redmonster.
@@ -252,9 +548,9 @@ class WriteRedmonster:
                     self.dest = None
                     print("Exception: %r" % e)
         else:
-            bsr = environ['REDMONSTER_SPECTRO_REDUX']
-            run2d = environ['RUN2D']
-            run1d = environ['RUN1D']
+            bsr = environ.get('REDMONSTER_SPECTRO_REDUX')
+            run2d = environ.get('RUN2D')
+            run1d = environ.get('RUN1D')
             if bsr and run2d and run1d:
                 testpath = join(bsr, run2d, '%s'%
                                 __version__.replace('.', '_'), '%s' %
@@ -270,10 +566,13 @@ class WriteRedmonster:
                         print("Exception: %r" % e)
             else: self.dest = None
 
-    def create_hdulist(self):
+    def create_hdulist(self, date=None):
+        # date is the DATE_RM timestamp; defaults to now
+        if date is None: date = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
+        zpick = self.zpick
         # Get old header, append new stuff
         try:
-            hdr = self.zpick.hdr
+            hdr = zpick.hdr
         except AttributeError:
             hdr = fits.Header()
         try:
@@ -288,231 +587,120 @@ class WriteRedmonster:
             hdr.remove('DUSTB')
         except KeyError:
             pass
-        try:
-            hdr.extend([('SPEC2D',environ['RUN2D'],
-                     'Version of spec2d reductions used')])
-        except KeyError:
-            pass
+        run2d = environ.get('RUN2D')
+        if run2d is not None:
+            hdr.extend([('SPEC2D',run2d,
+                         'Version of spec2d reductions used')])
         hdr.extend([('VERS_RM',__version__,'Version of redmonster used'),
-                    ('DATE_RM',strftime("%Y-%m-%d_%H:%M:%S", gmtime()),
-                     'Time of redmonster completion'),
-                    ('NFIBERS', len(self.zpick.z), 'Number of fibers'),
-                    ('NZ', len(self.zpick.z[0]),'Number of redshifts retained'),
-                    ('RCHI2TH',self.zpick.rchi2threshold,
+                    ('DATE_RM',date,'Time of redmonster completion'),
+                    ('NFIBERS', len(zpick.z), 'Number of fibers'),
+                    ('NZ', len(zpick.z[0]),'Number of redshifts retained'),
+                    ('RCHI2TH',zpick.rchi2threshold,
                      'Reduced chi**2 threshold used')])
         prihdu = fits.PrimaryHDU(header=hdr)
         # Columns for 1st BIN table
         colslist = []
-        if hasattr(self.zpick, 'fiberid'):
+        if hasattr(zpick, 'fiberid'):
             colslist.append( fits.Column(name='FIBERID', format='J',
-                                     array=self.zpick.fiberid) )
+                                     array=zpick.fiberid) )
         colslist.append( fits.Column(name='DOF', format='J',
-                                     array=self.zpick.dof) )
-        if hasattr(self.zpick, 'boss_target1'):
+                                     array=zpick.dof) )
+        if hasattr(zpick, 'boss_target1'):
             colslist.append( fits.Column(name='BOSS_TARGET1', format='J',
-                                         array=self.zpick.boss_target1) )
-        if hasattr(self.zpick, 'eboss_target0'):
+                                         array=zpick.boss_target1) )
+        if hasattr(zpick, 'eboss_target0'):
             colslist.append( fits.Column(name='EBOSS_TARGET0', format='J',
-                                         array=self.zpick.eboss_target0) )
-        if hasattr(self.zpick, 'eboss_target1'):
+                                         array=zpick.eboss_target0) )
+        if hasattr(zpick, 'eboss_target1'):
             colslist.append( fits.Column(name='EBOSS_TARGET1', format='J',
-                                         array=self.zpick.eboss_target1) )
-        for i in range(len(self.zpick.z[0])):
-            zlist = []
-            zerrlist = []
-            classlist = []
-            subclasslist = []
-            minvectorlist = []
-            npolylist = []
-            fnamelist = []
-            grouplist = []
-            npixsteplist = []
-            minrchi2list = []
-            fslist = []
-            for j in range(len(self.zpick.z)):
-                zlist.append( self.zpick.z[j][i] )
-                zerrlist.append( self.zpick.z_err[j][i] )
-                classlist.append( self.zpick.type[j][i] )
-                subclasslist.append( repr(self.zpick.subtype[j][i]) )
-                fnamelist.append( self.zpick.fname[j][i] )
-                grouplist.append( self.zpick.group[j][i] )
-                minvectorlist.append( repr(self.zpick.minvector[j][i]) )
-                npolylist.append( self.zpick.npoly[j][i] )
-                npixsteplist.append( self.zpick.npixstep[j][i] )
-                minrchi2list.append( self.zpick.minrchi2[j][i] )
-                fslist.append( repr(self.zpick.fs[j][i]) )
+                                         array=zpick.eboss_target1) )
+        # Per-rank quantities as (nfibers, nz) arrays, sliced by column below
+        z = n.asarray(zpick.z)
+        z_err = n.asarray(zpick.z_err)
+        types = n.asarray(zpick.type)
+        fnames = n.asarray(zpick.fname)
+        groups = n.asarray(zpick.group)
+        npoly = n.asarray(zpick.npoly)
+        npixstep = n.asarray(zpick.npixstep)
+        minrchi2 = n.asarray(zpick.minrchi2)
+        # Ragged per-rank quantities, packed one rank at a time
+        subtypes = zpick.subtype
+        minvectors = zpick.minvector
+        thetas = zpick.fs
+        for i in range(z.shape[1]):
+            subclass = [repr(x[i]) for x in subtypes]
+            minvector, nminvector = _pack_vectors([x[i] for x in minvectors],
+                                                  -1)
+            theta, ntheta = _pack_vectors([x[i] for x in thetas], n.nan)
             colslist.append( fits.Column(name='Z%s' % (i+1), format='E',
-                                         array=zlist) )
+                                         array=z[:,i]) )
             colslist.append( fits.Column(name='Z_ERR%s' % (i+1), format='E',
-                                         array=zerrlist) )
-            colslist.append( fits.Column(name='CLASS%s' % (i+1), format='%iA' %
-                                         max(list(map(len,classlist))),
-                                         array=classlist) )
-            colslist.append( fits.Column(name='SUBCLASS%s' % (i+1), format='%iA'
-                                         % max(list(map(len,subclasslist))),
-                                         array=subclasslist) )
-            colslist.append( fits.Column(name='FNAME%s' % (i+1), format='%iA' %
-                                         max(list(map(len,fnamelist))),
-                                         array=fnamelist) )
+                                         array=z_err[:,i]) )
+            colslist.append( _str_col('CLASS%s' % (i+1), types[:,i]) )
+            colslist.append( _str_col('SUBCLASS%s' % (i+1), subclass) )
+            colslist.append( _str_col('FNAME%s' % (i+1), fnames[:,i]) )
             colslist.append( fits.Column(name='GROUP%s' % (i+1), format='J',
-                                         array=grouplist) )
+                                         array=groups[:,i]) )
             colslist.append( fits.Column(name='MINVECTOR%s' % (i+1),
-                                         format='%iA' %
-                                         max(list(map(len,minvectorlist))),
-                                         array=minvectorlist) )
+                                         format='%iJ' % minvector.shape[1],
+                                         array=minvector) )
+            colslist.append( fits.Column(name='NMINVECTOR%s' % (i+1),
+                                         format='J', array=nminvector) )
             colslist.append( fits.Column(name='MINRCHI2%s' % (i+1), format='E',
-                                         array=minrchi2list) )
+                                         array=minrchi2[:,i]) )
             colslist.append( fits.Column(name='NPOLY%s' % (i+1), format='J',
-                                         array=npolylist) )
+                                         array=npoly[:,i]) )
             colslist.append( fits.Column(name='NPIXSTEP%s' % (i+1), format='J',
-                                         array=npixsteplist) )
-            colslist.append( fits.Column(name='THETA%s' % (i+1), format='%iA' %
-                                         max(list(map(len,fslist))), array=fslist) )
+                                         array=npixstep[:,i]) )
+            colslist.append( fits.Column(name='THETA%s' % (i+1), format='%iD' %
+                                         theta.shape[1], array=theta) )
+            colslist.append( fits.Column(name='NTHETA%s' % (i+1), format='J',
+                                         array=ntheta) )
         colslist.append( fits.Column(name='ZWARNING', format='J',
-                                     array=self.zpick.zwarning) )
+                                     array=zpick.zwarning) )
         colslist.append( fits.Column(name='RCHI2DIFF', format='E',
-                                     array=self.zpick.rchi2diff) )
+                                     array=zpick.rchi2diff) )
         colslist.append( fits.Column(name='CHI2NULL', format='E',
-                                     array=self.zpick.chi2_null) )
+                                     array=zpick.chi2_null) )
         colslist.append( fits.Column(name='SN2DATA', format='E',
-                                     array=self.zpick.sn2_data) )
+                                     array=zpick.sn2_data) )
         cols = fits.ColDefs(colslist)
         tbhdu = fits.BinTableHDU.from_columns(cols)
         # ImageHDU of models
-        sechdu = fits.ImageHDU(data=self.zpick.models)
+        sechdu = _models_hdu(zpick.models)
         self.thdulist = fits.HDUList([prihdu, tbhdu, sechdu])
 
+    def _resolve(self, filename, ts):
+        '''
+        Full output path for filename, in self.dest or else the current
+        directory.  Unless overwriting, an existing file is left alone and
+        timestamp ts is appended to the new filename instead.
+        '''
+        path = join(self.dest if self.dest is not None else getcwd(), filename)
+        if self.overwrite or not exists(path):
+            return path
+        root, ext = splitext(path)
+        return '%s-%s%s' % (root, ts, ext)
+
     def write_fiber(self):
         self.overwrite = True # Temporary fix!!
-        self.create_hdulist()
-        if self.overwrite:
-            if self.dest is not None:
-                self.thdulist.writeto(join(self.dest, '%s' %
-                                           'redmonster-%s-%s-%03d.fits' %
-                                           (self.zpick.plate, self.zpick.mjd,
-                                            self.zpick.fiberid[0])),
-                                      overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % \
-                        join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' %
-                             (self.zpick.plate, self.zpick.mjd,
-                              self.zpick.fiberid[0])))
-            else:
-                self.thdulist.writeto('redmonster-%s-%s-%03d.fits' %
-                                      (self.zpick.plate, self.zpick.mjd,
-                                       self.zpick.fiberid[0]),
-                                      overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % \
-                        join( getcwd(), 'redmonster-%s-%s-%03d.fits' %
+        # One timestamp for both DATE_RM and any timestamped filename
+        ts = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
+        self.create_hdulist(ts)
+        path = self._resolve('redmonster-%s-%s-%03d.fits' %
                              (self.zpick.plate, self.zpick.mjd,
-                              self.zpick.fiberid[0]) ) )
-        else:
-            if self.dest is not None:
-                if exists(join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits' %
-                               (self.zpick.plate, self.zpick.mjd,
-                                self.zpick.fiberid[0]))):
-                    self.thdulist.writeto(join(self.dest, '%s' %
-                                               'redmonster-%s-%s-%s-%03d.fits' %
-                                               (self.zpick.plate,
-                                                self.zpick.mjd,
-                                                self.zpick.fiberid[0],
-                                                strftime("%Y-%m-%d_%H:%M:%S",
-                                                         gmtime()))))
-                    print('Writing redmonster file to %s' % \
-                            join(self.dest, '%s' %
-                                 'redmonster-%s-%s-%s-%03d.fits' %
-                                 (self.zpick.plate, self.zpick.mjd,
-                                  self.zpick.fiberid[0],
-                                  strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto(join(self.dest, '%s' %
-                                               'redmonster-%s-%s-%03d.fits' %
-                                               (self.zpick.plate,
-                                                self.zpick.mjd,
-                                                self.zpick.fiberid[0])))
-                    print('Writing redmonster file to %s' % \
-                            join(self.dest, '%s' % 'redmonster-%s-%s-%03d.fits'
-                                 % (self.zpick.plate, self.zpick.mjd,
-                                    self.zpick.fiberid[0])))
-            else:
-                if exists('redmonster-%s-%s-%03d.fits' %
-                          (self.zpick.plate, self.zpick.mjd,
-                           self.zpick.fiberid[0])):
-                    self.thdulist.writeto('redmonster-%s-%s-%s-%03d.fits' %
-                                          (self.zpick.plate, self.zpick.mjd,
-                                           self.zpick.fiberid[0],
-                                           strftime("%Y-%m-%d_%H:%M:%S",
-                                                    gmtime())))
-                    print('Writing redmonster file to %s' % \
-                            join( getcwd(), 'redmonster-%s-%s-%s-%03d.fits' %
-                                 (self.zpick.plate, self.zpick.mjd,
-                                  self.zpick.fiberid[0],
-                                  strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto('redmonster-%s-%s-%03d.fits' %
-                                          (self.zpick.plate, self.zpick.mjd,
-                                           self.zpick.fiberid[0]))
-                    print('Writing redmonster file to %s' % \
-                            join( getcwd(), 'redmonster-%s-%s-%03d.fits' %
-                                 (self.zpick.plate, self.zpick.mjd,
-                                  self.zpick.fiberid[0])))
+                              self.zpick.fiberid[0]), ts)
+        _writeto(self.thdulist, path, overwrite=self.overwrite)
+        print('Writing redmonster file to %s' % path)
 
     def write_plate(self):
-        self.create_hdulist()
-        if self.overwrite:
-            if self.dest is not None:
-                self.thdulist.writeto(join(self.dest, '%s' %
-                                           'redmonster-%s-%s.fits' %
-                                           (self.zpick.plate, self.zpick.mjd)),
-                                      overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % \
-                        join(self.dest, '%s' % 'redmonster-%s-%s.fits' %
-                             (self.zpick.plate, self.zpick.mjd)))
-            else:
-                self.thdulist.writeto('redmonster-%s-%s.fits' %
-                                      (self.zpick.plate, self.zpick.mjd),
-                                      overwrite=self.overwrite)
-                print('Writing redmonster file to %s' % \
-                        join( getcwd(), 'redmonster-%s-%s.fits' %
-                             (self.zpick.plate, self.zpick.mjd) ))
-        else:
-            if self.dest is not None:
-                if exists(join(self.dest, '%s' % 'redmonster-%s-%s.fits' %
-                               (self.zpick.plate, self.zpick.mjd))):
-                    self.thdulist.writeto(join(self.dest,
-                                               '%s' % 'redmonster-%s-%s-%s.fits'
-                                               % (self.zpick.plate,
-                                                  self.zpick.mjd,
-                                                  strftime("%Y-%m-%d_%H:%M:%S",
-                                                           gmtime()))))
-                    print('Writing redmonster file to %s' % \
-                            join(self.dest, '%s' % 'redmonster-%s-%s-%s.fits' %
-                                 (self.zpick.plate, self.zpick.mjd,
-                                  strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto(join(self.dest, '%s' %
-                                               'redmonster-%s-%s.fits' %
-                                               (self.zpick.plate,
-                                                self.zpick.mjd)))
-                    print('Writing redmonster file to %s' % \
-                            join(self.dest, '%s' % 'redmonster-%s-%s.fits' %
-                                 (self.zpick.plate, self.zpick.mjd)))
-            else:
-                if exists('redmonster-%s-%s.fits' % (self.zpick.plate,
-                                                     self.zpick.mjd)):
-                    self.thdulist.writeto('redmonster-%s-%s-%s.fits' %
-                                          (self.zpick.plate, self.zpick.mjd,
-                                           strftime("%Y-%m-%d_%H:%M:%S",
-                                                    gmtime())))
-                    print('Writing redmonster file to %s' % \
-                            join( getcwd(), 'redmonster-%s-%s-%s.fits' %
-                                 (self.zpick.plate, self.zpick.mjd,
-                                  strftime("%Y-%m-%d_%H:%M:%S", gmtime()))))
-                else:
-                    self.thdulist.writeto('redmonster-%s-%s.fits' %
-                                          (self.zpick.plate, self.zpick.mjd))
-                    print('Writing redmonster file to %s' % \
-                            join( getcwd(), 'redmonster-%s-%s.fits' %
-                                 (self.zpick.plate, self.zpick.mjd)))
+        # One timestamp for both DATE_RM and any timestamped filename
+        ts = strftime("%Y-%m-%d_%H:%M:%S", gmtime())
+        self.create_hdulist(ts)
+        path = self._resolve('redmonster-%s-%s.fits' %
+                             (self.zpick.plate, self.zpick.mjd), ts)
+        _writeto(self.thdulist, path, overwrite=self.overwrite)
+        print('Writing redmonster file to %s' % path)
 
     def write_gen(self):
         self.create_hdulist()
@@ -535,12 +723,39 @@ instantiate with no plate, mjd and call methond merge_plates()
 # t.hutchinson@utah.edu
 
 
+# Per-rank columns of merged fiber files: name (less the rank number),
+# TFORM, MergeRedmonster attribute, and the padding of variable-length
+# vectors (None for scalars)
+_RANK_COLUMNS = (('Z', 'E', 'z', None),
+                 ('Z_ERR', 'E', 'z_err', None),
+                 ('CLASS', 'A', 'type', None),
+                 ('SUBCLASS', 'A', 'subtype', None),
+                 ('FNAME', 'A', 'fname', None),
+                 ('GROUP', 'J', 'group', None),
+                 ('MINVECTOR', 'J', 'minvector', -1),
+                 ('MINRCHI2', 'E', 'minrchi2', None),
+                 ('NPOLY', 'J', 'npoly', None),
+                 ('NPIXSTEP', 'J', 'npixstep', None),
+                 ('THETA', 'D', 'theta', n.nan))
+
+# Environment variables naming, in order, the top of the chi2 directory of
+# a plate; below them come the version directory and the plate, as used
+# by write_chi2arr
+_CHI2DIR_ENV = ('REDMONSTER_SPECTRO_REDUX', 'RUN2D')
+
+
 class MergeRedmonster:
     
     def __init__(self, plate=None, mjd=None, temp=None):
         self.plate = plate
         self.mjd = mjd
         self.temp = temp
+        # Directory write_chi2arr puts this plate's chi2 files in,
+        # resolved once
+        env = [environ.get(name) for name in _CHI2DIR_ENV]
+        self.chi2dir = join(*(env + [__version__.replace('.', '_'),
+                                     '%s' % plate])) if \
+                plate is not None and all(env) else None
     
     def merge_fibers(self):
         self.filepaths = []
@@ -555,82 +770,66 @@ class MergeRedmonster:
         self.fname = []
         self.npixstep = []
         self.boss_target1 = []
+        self.eboss_target0 = []
+        self.eboss_target1 = []
         self.chi2diff = []
         self.chi2_null = []
         self.sn2_data = []
         self.models = None
         self.hdr = None
-        try:
-            topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except KeyError as e:
-            topdir = None
-            print("Enviromental variable 'REDMONSTER_SPECTRO_REDUX' not set: \
-                    %r" % e)
-        try:
-            run2d = environ['RUN2D']
-        except KeyError as e:
-            run2d = None
-            print("Enviromental variable 'RUN2D' not set: %r" % e)
-        try:
-            run1d = environ['RUN1D']
-        except KeyError as e:
-            run1d = None
-            print("Enviromental variable 'RUN1D' not set: %r" % e)
+        topdir = _getenv('REDMONSTER_SPECTRO_REDUX')
+        run2d = _getenv('RUN2D')
+        run1d = _getenv('RUN1D')
 
         fiberdir = join(topdir, run2d, '%s' % __version__.replace('.', '_'), '%s' % self.plate,
                         'redmonster-%s-%s-*.fits' % (self.plate, self.mjd)) if \
                                topdir and run2d and run1d else None
         if fiberdir:
             for path in iglob(fiberdir):
+                m = _FILE_RE.match(basename(path))
+                if m is None or m.group('fiber') is None: continue
                 self.filepaths.append(path)
-                fiberfile = basename(path)
-                self.fiberid.append( int(fiberfile[22:25]) )
+                self.fiberid.append( int(m.group('fiber')) )
             self.z = n.zeros( (len(self.fiberid),5) )
             self.z_err = n.zeros( self.z.shape )
-            try: self.hdr = fits.open( join( environ['BOSS_SPECTRO_REDUX'],
-                                            environ['RUN2D'], '%s' % self.plate,
-                                            'spPlate-%s-%s.fits' %
-                                            (self.plate,self.mjd) ) )[0].header
-            except Exception as e:
-                self.hdr = fits.Header()
-                print("Exception: %r" % e)
-            npix = fits.open( join( environ['BOSS_SPECTRO_REDUX'],
-                                   environ['RUN2D'], '%s' % self.plate,
-                                   'spPlate-%s-%s.fits' %
-                                   (self.plate,self.mjd) ) )[0].data.shape[1]
+            # Only the header is needed, so the image data is never read
+            with fits.open( join( environ['BOSS_SPECTRO_REDUX'],
+                                 run2d, '%s' % self.plate,
+                                 'spPlate-%s-%s.fits' % (self.plate,self.mjd) ),
+                           memmap=True ) as hdu:
+                self.hdr = hdu[0].header
+                npix = self.hdr['NAXIS1']
             #npix = fits.open('/uufs/chpc.utah.edu/common/home/sdss00/ebosswork/eboss/spectro/redux/test/bautista/test_dr14/%s/spPlate-%s-%s.fits' % (self.plate, self.plate, self.mjd)).data.shape[1]
             self.models = n.zeros( (self.z.shape[0],npix) )
-            self.filepaths.sort()
-            self.fiberid.sort()
-            for i, path in enumerate(self.filepaths):
-                hdu = fits.open(path)
-                self.z[i,0] = hdu[1].data.Z1[0]
-                self.z[i,1] = hdu[1].data.Z2[0]
-                self.z_err[i,0] = hdu[1].data.Z_ERR1[0]
-                self.z_err[i,1] = hdu[1].data.Z_ERR2[0]
-                self.type.append(hdu[1].data.CLASS1[0])
-                self.subtype.append(hdu[1].data.SUBCLASS1[0])
-                self.minvector.append(hdu[1].data.MINVECTOR1[0])
-                self.zwarning.append(hdu[1].data.ZWARNING[0])
-                self.dof.append(hdu[1].data.DOF[0])
-                self.npoly.append(hdu[1].data.NPOLY1[0])
-                self.fname.append(hdu[1].data.FNAME1[0])
-                self.npixstep.append(hdu[1].data.NPIXSTEP1[0])
-                self.chi2diff.append(hdu[1].data.RCHI2DIFF[0])
-                try:
-                    self.boss_target1.append(hdu[1].data.BOSS_TARGET1[0])
-                except AttributeError:
-                    pass
-                try:
-                    self.eboss_target0.append(hdu[1].data.EBOSS_TARGET0[0])
-                except AttributeError:
-                    pass
-                try:
-                    self.eboss_target1.append(hdu[1].data.EBOSS_TARGET1[0])
-                except AttributeError:
-                    pass
-                self.models[i] = hdu[2].data[0]
-                #remove(path)
+            self.fiberid, self.filepaths = _by_fiberid(self.fiberid,
+                                                       self.filepaths)
+            # The reads are I/O-bound, so a bounded thread pool suffices
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                # Fill in each fiber as its file is read, rather than
+                # holding every row and model until all are done
+                for i, (row, models) in enumerate(
+                        pool.map(_read_one_fiber, self.filepaths)):
+                    self.z[i,0] = row['Z1']
+                    self.z[i,1] = row['Z2']
+                    self.z_err[i,0] = row['Z_ERR1']
+                    self.z_err[i,1] = row['Z_ERR2']
+                    self.type.append(row['CLASS1'])
+                    self.subtype.append(row['SUBCLASS1'])
+                    self.minvector.append(row['MINVECTOR1'])
+                    self.zwarning.append(row['ZWARNING'])
+                    self.dof.append(row['DOF'])
+                    self.npoly.append(row['NPOLY1'])
+                    self.fname.append(row['FNAME1'])
+                    self.npixstep.append(row['NPIXSTEP1'])
+                    self.chi2diff.append(row['RCHI2DIFF'])
+                    if 'BOSS_TARGET1' in row:
+                        self.boss_target1.append(row['BOSS_TARGET1'])
+                    if 'EBOSS_TARGET0' in row:
+                        self.eboss_target0.append(row['EBOSS_TARGET0'])
+                    if 'EBOSS_TARGET1' in row:
+                        self.eboss_target1.append(row['EBOSS_TARGET1'])
+                    self.models[i] = models
+                    #remove(path)
                                
             output = WriteRedmonster(self, overwrite=True)
             output.write_plate()
@@ -652,84 +851,74 @@ class MergeRedmonster:
         self.plates = []
         self.models = n.zeros((1,1))
         self.hdr = fits.Header()
-        try:
-            topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except KeyError as e:
-            topdir = None
-            print("Environ variable 'REDMONSTER_SPECTRO_REDUX is not set: %r" %\
-                    e)
-        try: run2d = environ['RUN2D']
-        except KeyError:
-            run2d = None
-            print("Environmental variable 'RUN2D' is not set: %r" % e)
-        try:
-            run1d = environ['RUN1D']
-        except KeyError:
-            run1d = None
-            print("Environmental variable 'RUN1D' is not set: %r" % e)
+        topdir = _getenv('REDMONSTER_SPECTRO_REDUX')
+        run2d = _getenv('RUN2D')
+        run1d = _getenv('RUN1D')
         platedir = join( topdir, run2d, '*') if topdir and run2d else None
         if platedir:
             for path in iglob(platedir):
                 self.plates.append( basename(path) )
-            self.plates.sort()
-            for listitem in self.plates:
-                if listitem[-5:] == '.fits': self.plates.remove(listitem)
+            self.plates = [plate for plate in sorted(self.plates) if not
+                           plate.endswith('.fits')]
             self.fiberid = self.plates
+            # First pass: find the plate files and read their row counts
+            # from the headers, so the outputs can be allocated up front
+            filepaths = []
             for plate in self.plates:
                 print('Merging plate %s' % plate)
-                mjds = []
+                mjds = set()
                 try:
                     for x in iglob( join( topdir, run2d, '%s' % __version__.replace('.', '_'), '%s' % plate,
                                          'redmonster-%s-*.fits' % plate) ):
-                        if basename(x)[16:21] not in mjds:
-                            mjds.append(basename(x)[16:21])
+                        m = _FILE_RE.match(basename(x))
+                        if m is not None: mjds.add(m.group('mjd'))
                 except Exception as e:
                     print("Exception: %r" % e)
                     mjds = None
-                if mjds is not [] and mjds is not None:
-                    for mjd in mjds:
+                if mjds:
+                    for mjd in sorted(mjds):
                         filepath = join( topdir, run2d, '%s' % __version__.replace('.', '_'), str(plate),
                                         'redmonster-%s-%s.fits' % (plate, mjd))
                         if exists(filepath):
-                            hdu = fits.open(filepath)
-                            self.type += hdu[1].data.CLASS.tolist()
-                            self.subtype += hdu[1].data.SUBCLASS.tolist()
-                            self.minvector += hdu[1].data.MINVECTOR.tolist()
-                            self.zwarning += hdu[1].data.ZWARNING.tolist()
-                            self.dof += hdu[1].data.DOF.tolist()
-                            self.npoly += hdu[1].data.NPOLY.tolist()
-                            self.fname += hdu[1].data.FNAME.tolist()
-                            self.npixstep += hdu[1].data.NPIXSTEP.tolist()
-                            self.chi2diff += hdu[1].data.CHI2DIFF.tolist()
-                            try:
-                                self.z1 = n.append(self.z1, hdu[1].data.Z1)
-                            except NameError:
-                                self.z1 = hdu[1].data.Z1
-                            try:
-                                self.z_err1 = n.append(self.z_err1,
-                                                        hdu[1].data.Z_ERR1)
-                            except NameError:
-                                self.z_err1 = hdu[1].data.Z_ERR1
-                            try:
-                                self.z2 = n.append(self.z2, hdu[1].data.Z2)
-                            except NameError:
-                                self.z2 = hdu[1].data.Z2
-                            try:
-                                self.z_err2 = n.append(self.z_err2,
-                                                        hdu[1].data.Z_ERR2)
-                            except NameError:
-                                self.z_err2 = hdu[1].data.Z_ERR2
-        self.z = n.zeros( (self.z1.shape[0],2) )
-        self.z_err = n.zeros( self.z.shape )
-        self.z[:,0] = self.z1
-        self.z[:,1] = self.z2
-        self.z_err[:,0] = self.z_err1
-        self.z_err[:,1] = self.z_err2
+                            filepaths.append( (filepath, fits.getval(filepath,
+                                                                     'NAXIS2',
+                                                                     ext=1)) )
+            nobj = sum([nrows for filepath, nrows in filepaths])
+            self.type = n.zeros(nobj, dtype=object)
+            self.subtype = n.zeros(nobj, dtype=object)
+            self.minvector = n.zeros(nobj, dtype=object)
+            self.zwarning = n.zeros(nobj, dtype=int)
+            self.dof = n.zeros(nobj, dtype=int)
+            self.npoly = n.zeros(nobj, dtype=int)
+            self.fname = n.zeros(nobj, dtype=object)
+            self.npixstep = n.zeros(nobj, dtype=int)
+            self.chi2diff = n.zeros(nobj)
+            self.z = n.zeros( (nobj,2) )
+            self.z_err = n.zeros( self.z.shape )
+            # Second pass: fill each plate's slice of the outputs
+            i = 0
+            for filepath, nrows in filepaths:
+                with fits.open(filepath) as hdu:
+                    tbl = hdu[1].data
+                    self.type[i:i+nrows] = tbl['CLASS']
+                    self.subtype[i:i+nrows] = tbl['SUBCLASS']
+                    self.minvector[i:i+nrows] = tbl['MINVECTOR']
+                    self.zwarning[i:i+nrows] = tbl['ZWARNING']
+                    self.dof[i:i+nrows] = tbl['DOF']
+                    self.npoly[i:i+nrows] = tbl['NPOLY']
+                    self.fname[i:i+nrows] = tbl['FNAME']
+                    self.npixstep[i:i+nrows] = tbl['NPIXSTEP']
+                    self.chi2diff[i:i+nrows] = tbl['CHI2DIFF']
+                    self.z[i:i+nrows,0] = tbl['Z1']
+                    self.z[i:i+nrows,1] = tbl['Z2']
+                    self.z_err[i:i+nrows,0] = tbl['Z_ERR1']
+                    self.z_err[i:i+nrows,1] = tbl['Z_ERR2']
+                i += nrows
         
         output = WriteRedmonster(self)
         output.create_hdulist()
-        output.thdulist.writeto( join( topdir, run2d, '%s' % __version__.replace('.', '_'), 'redmonsterAll-%s.fits' %
-                                      run2d), overwrite=True)
+        _writeto( output.thdulist, join( topdir, run2d, '%s' % __version__.replace('.', '_'), 'redmonsterAll-%s.fits' %
+                                         run2d), overwrite=True)
 
 
     def merge_fibers2(self):
@@ -739,353 +928,99 @@ class MergeRedmonster:
         self.boss_target1 = []
         self.eboss_target0 = []
         self.eboss_target1 = []
-        self.z1 = []
-        self.z_err1 = []
-        self.class1 = []
-        self.subclass1 = []
-        self.fname1 = []
-        self.group1 = []
-        self.minvector1 = []
-        self.minrchi21 = []
-        self.npoly1 = []
-        self.npixstep1 = []
-        self.theta1 = []
-        self.z2 = []
-        self.z_err2 = []
-        self.class2 = []
-        self.subclass2 = []
-        self.fname2 = []
-        self.group2 = []
-        self.minvector2 = []
-        self.minrchi22 = []
-        self.npoly2 = []
-        self.npixstep2 = []
-        self.theta2 = []
-        self.z3 = []
-        self.z_err3 = []
-        self.class3 = []
-        self.subclass3 = []
-        self.fname3 = []
-        self.group3 = []
-        self.minvector3 = []
-        self.minrchi23 = []
-        self.npoly3 = []
-        self.npixstep3 = []
-        self.theta3 = []
-        self.z4 = []
-        self.z_err4 = []
-        self.class4 = []
-        self.subclass4 = []
-        self.fname4 = []
-        self.group4 = []
-        self.minvector4 = []
-        self.minrchi24 = []
-        self.npoly4 = []
-        self.npixstep4 = []
-        self.theta4 = []
-        self.z5 = []
-        self.z_err5 = []
-        self.class5 = []
-        self.subclass5 = []
-        self.fname5 = []
-        self.group5 = []
-        self.minvector5 = []
-        self.minrchi25 = []
-        self.npoly5 = []
-        self.npixstep5 = []
-        self.theta5 = []
         self.zwarning = []
         self.rchi2diff = []
         self.chi2_null = []
         self.sn2_data = []
-        try:
-            topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except KeyError:
-            topdir = None
-            print("Environmental variable 'REDMONSTER_SPECTRO_REDUX' is \
-            not set: %r" % e)
-        try:
-            run2d = environ['RUN2D']
-        except KeyError:
-            run2d = None
-            print("Environmental variable 'RUN2D' is not set: %r" % e)
-        try:
-            run1d = environ['RUN1D']
-        except KeyError:
-            run1d = None
-            print("Environmental variable 'RUN1D' is not set: %r" % e)
+        topdir = _getenv('REDMONSTER_SPECTRO_REDUX')
+        run2d = _getenv('RUN2D')
+        run1d = _getenv('RUN1D')
         fiberdir = join(topdir, run2d, '%s' % __version__.replace('.', '_'), '%s' % self.plate,
                         'redmonster-%s-%s-*.fits' % (self.plate, self.mjd)) if \
                                topdir and run2d and run1d else None
         
         if fiberdir:
             for path in iglob(fiberdir):
+                m = _FILE_RE.match(basename(path))
+                if m is None or m.group('fiber') is None: continue
                 self.filepaths.append( path )
-                fiberfile = basename( path )
-                if len(self.plate) == 4:
-                    self.fiberid.append( int(fiberfile[22:25])+1 )
-                elif len(self.plate) == 5:
-                    self.fiberid.append( int(fiberfile[23:26])+1 )
-                else:
-                    raise ValueError('Plate needs to be either 4 or 5 digits.')
-            try:
-                
-                self.hdr = fits.open( join( environ['BOSS_SPECTRO_REDUX'], environ['RUN2D'], '%s' % self.plate, 'spPlate-%s-%s.fits' % (self.plate,self.mjd) ) )[0].header
-                
-                #self.hdr = fits.open('/uufs/chpc.utah.edu/common/home/sdss00/ebosswork/eboss/spectro/redux/test/bautista/test_dr14/%s/spPlate-%s-%s.fits' % (self.plate, self.plate, self.mjd))[0].header
-            except AttributeError:
-                self.hdr = fits.Header()
-            
-            
-            npix = fits.open( join( environ['BOSS_SPECTRO_REDUX'],environ['RUN2D'], '%s' % self.plate,'spPlate-%s-%s.fits' %(self.plate,self.mjd) ) )[0].data.shape[1]
+                self.fiberid.append( int(m.group('fiber'))+1 )
+            # Only the header is needed, so the image data is never read
+            with fits.open( join( environ['BOSS_SPECTRO_REDUX'], run2d, '%s' % self.plate, 'spPlate-%s-%s.fits' % (self.plate,self.mjd) ), memmap=True ) as hdu:
+                self.hdr = hdu[0].header
+                npix = self.hdr['NAXIS1']
             
+            #self.hdr = fits.open('/uufs/chpc.utah.edu/common/home/sdss00/ebosswork/eboss/spectro/redux/test/bautista/test_dr14/%s/spPlate-%s-%s.fits' % (self.plate, self.plate, self.mjd))[0].header
             #npix = fits.open('/uufs/chpc.utah.edu/common/home/sdss00/ebosswork/eboss/spectro/redux/test/bautista/test_dr14/%s/spPlate-%s-%s.fits' % (self.plate, self.plate, self.mjd))[0].data.shape[1]
-            self.models = n.zeros( (len(self.fiberid),5,npix) )
-            self.filepaths.sort()
-            self.fiberid.sort()
-            haveHeader = False
-            for i, path in enumerate(self.filepaths):
-                hdu = fits.open(path)
-                if not haveHeader:
-                    self.hdr = hdu[0].header
-                    haveHeader = True
-                self.dof.append(hdu[1].data.DOF[0])
-                self.z1.append(hdu[1].data.Z1[0])
-                self.z_err1.append(hdu[1].data.Z_ERR1[0])
-                self.class1.append(hdu[1].data.CLASS1[0])
-                self.subclass1.append(hdu[1].data.SUBCLASS1[0])
-                self.fname1.append(hdu[1].data.FNAME1[0])
-                self.group1.append(hdu[1].data.GROUP1[0])
-                self.minvector1.append(hdu[1].data.MINVECTOR1[0])
-                self.minrchi21.append(hdu[1].data.MINRCHI21[0])
-                self.npoly1.append(hdu[1].data.NPOLY1[0])
-                self.npixstep1.append(hdu[1].data.NPIXSTEP1[0])
-                self.theta1.append(hdu[1].data.THETA1[0])
-                self.z2.append(hdu[1].data.Z2[0])
-                self.z_err2.append(hdu[1].data.Z_ERR2[0])
-                self.class2.append(hdu[1].data.CLASS2[0])
-                self.subclass2.append(hdu[1].data.SUBCLASS2[0])
-                self.fname2.append(hdu[1].data.FNAME2[0])
-                self.group2.append(hdu[1].data.GROUP2[0])
-                self.minvector2.append(hdu[1].data.MINVECTOR2[0])
-                self.minrchi22.append(hdu[1].data.MINRCHI22[0])
-                self.npoly2.append(hdu[1].data.NPOLY2[0])
-                self.npixstep2.append(hdu[1].data.NPIXSTEP2[0])
-                self.theta2.append(hdu[1].data.THETA2[0])
-                self.z3.append(hdu[1].data.Z3[0])
-                self.z_err3.append(hdu[1].data.Z_ERR3[0])
-                self.class3.append(hdu[1].data.CLASS3[0])
-                self.subclass3.append(hdu[1].data.SUBCLASS3[0])
-                self.fname3.append(hdu[1].data.FNAME3[0])
-                self.group3.append(hdu[1].data.GROUP3[0])
-                self.minvector3.append(hdu[1].data.MINVECTOR3[0])
-                self.minrchi23.append(hdu[1].data.MINRCHI23[0])
-                self.npoly3.append(hdu[1].data.NPOLY3[0])
-                self.npixstep3.append(hdu[1].data.NPIXSTEP3[0])
-                self.theta3.append(hdu[1].data.THETA3[0])
-                self.z4.append(hdu[1].data.Z4[0])
-                self.z_err4.append(hdu[1].data.Z_ERR4[0])
-                self.class4.append(hdu[1].data.CLASS4[0])
-                self.subclass4.append(hdu[1].data.SUBCLASS4[0])
-                self.fname4.append(hdu[1].data.FNAME4[0])
-                self.group4.append(hdu[1].data.GROUP4[0])
-                self.minvector4.append(hdu[1].data.MINVECTOR4[0])
-                self.minrchi24.append(hdu[1].data.MINRCHI24[0])
-                self.npoly4.append(hdu[1].data.NPOLY4[0])
-                self.npixstep4.append(hdu[1].data.NPIXSTEP4[0])
-                self.theta4.append(hdu[1].data.THETA4[0])
-                self.z5.append(hdu[1].data.Z5[0])
-                self.z_err5.append(hdu[1].data.Z_ERR5[0])
-                self.class5.append(hdu[1].data.CLASS5[0])
-                self.subclass5.append(hdu[1].data.SUBCLASS5[0])
-                self.fname5.append(hdu[1].data.FNAME5[0])
-                self.group5.append(hdu[1].data.GROUP5[0])
-                self.minvector5.append(hdu[1].data.MINVECTOR5[0])
-                self.minrchi25.append(hdu[1].data.MINRCHI25[0])
-                self.npoly5.append(hdu[1].data.NPOLY5[0])
-                self.npixstep5.append(hdu[1].data.NPIXSTEP5[0])
-                self.theta5.append(hdu[1].data.THETA5[0])
-                self.zwarning.append(hdu[1].data.ZWARNING[0])
-                self.rchi2diff.append(hdu[1].data.RCHI2DIFF[0])
-                self.chi2_null.append(hdu[1].data.CHI2NULL[0])
-                self.sn2_data.append(hdu[1].data.SN2DATA[0])
-                try:
-                    self.boss_target1.append(hdu[1].data.BOSS_TARGET1[0])
-                except (NameError, AttributeError):
-                    pass
-                try:
-                    self.eboss_target0.append(hdu[1].data.EBOSS_TARGET0[0])
-                except (NameError, AttributeError):
-                    pass
-                try:
-                    self.eboss_target1.append(hdu[1].data.EBOSS_TARGET1[0])
-                except (NameError, AttributeError):
-                    pass
-                self.models[i] = hdu[2].data[0]
-                #remove(path)
+            self.models = _scratch_array( (len(self.fiberid),5,npix) )
+            self.fiberid, self.filepaths = _by_fiberid(self.fiberid,
+                                                       self.filepaths)
+            # Per-rank quantities, one (nfibers, 5) array each
+            shape = (len(self.filepaths), 5)
+            for name, tform, attr, fill in _RANK_COLUMNS:
+                setattr(self, attr, n.zeros(shape, dtype=object if
+                                            tform == 'A' or fill is not None
+                                            else int if tform == 'J'
+                                            else float))
+            ranked = [(name, fill, getattr(self, attr))
+                      for name, tform, attr, fill in _RANK_COLUMNS]
+            if self.filepaths:
+                self.hdr = fits.getheader(self.filepaths[0])
+            # The reads are I/O-bound, so a bounded thread pool suffices
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                # Fill in each fiber as its file is read, rather than
+                # holding every row and model until all are done
+                for i, (row, models) in enumerate(
+                        pool.map(_read_one_fiber, self.filepaths)):
+                    self.dof.append(row['DOF'])
+                    for r in range(5):
+                        for name, fill, values in ranked:
+                            value = row['%s%d' % (name, r+1)]
+                            values[i,r] = value if fill is None else \
+                                    unpack_vector(value,
+                                        row.get('N%s%d' % (name, r+1)))
+                    self.zwarning.append(row['ZWARNING'])
+                    self.rchi2diff.append(row['RCHI2DIFF'])
+                    self.chi2_null.append(row['CHI2NULL'])
+                    self.sn2_data.append(row['SN2DATA'])
+                    if 'BOSS_TARGET1' in row:
+                        self.boss_target1.append(row['BOSS_TARGET1'])
+                    if 'EBOSS_TARGET0' in row:
+                        self.eboss_target0.append(row['EBOSS_TARGET0'])
+                    if 'EBOSS_TARGET1' in row:
+                        self.eboss_target1.append(row['EBOSS_TARGET1'])
+                    self.models[i] = models
+                    #remove(path)
             self.hdr['NFIBERS'] = len(self.fiberid)
             prihdu = fits.PrimaryHDU(header=self.hdr)
-            colslist = []
-            colslist.append( fits.Column(name='FIBERID', format='J',
-                                         array=self.fiberid) )
-            colslist.append( fits.Column(name='DOF', format='J',
-                                         array=self.dof) )
-            try: colslist.append( fits.Column(name='BOSS_TARGET1', format='J',
-                                              array=self.boss_target1) )
-            except (NameError, AttributeError): pass
-            try: colslist.append( fits.Column(name='EBOSS_TARGET0', format='J',
-                                              array=self.eboss_target0) )
-            except (NameError, AttributeError): pass
-            try: colslist.append( fits.Column(name='EBOSS_TARGET1', format='J',
-                                              array=self.eboss_target1) )
-            except (NameError, AttributeError): pass
-            colslist.append( fits.Column(name='Z1', format='E', array=self.z1) )
-            colslist.append( fits.Column(name='Z_ERR1', format='E',
-                                         array=self.z_err1) )
-            colslist.append( fits.Column(name='CLASS1', format='%iA' %
-                                         max(list(map(len,self.class1))),
-                                         array=self.class1) )
-            colslist.append( fits.Column(name='SUBCLASS1', format='%iA' %
-                                         max(list(map(len,self.subclass1))),
-                                         array=self.subclass1) )
-            colslist.append( fits.Column(name='FNAME1', format='%iA' %
-                                         max(list(map(len,self.fname1))),
-                                         array=self.fname1) )
-            colslist.append( fits.Column(name='GROUP1', format='J',
-                                         array=self.group1) )
-            colslist.append( fits.Column(name='MINVECTOR1', format='%iA' %
-                                         max(list(map(len,self.minvector1))),
-                                         array=self.minvector1) )
-            colslist.append( fits.Column(name='MINRCHI21', format='E',
-                                         array=self.minrchi21) )
-            colslist.append( fits.Column(name='NPOLY1', format='J',
-                                         array=self.npoly1) )
-            colslist.append( fits.Column(name='NPIXSTEP1', format='J',
-                                         array=self.npixstep1) )
-            colslist.append( fits.Column(name='THETA1', format='%iA' %
-                                         max(list(map(len,self.theta1))),
-                                         array=self.theta1) )
-            colslist.append( fits.Column(name='Z2', format='E', array=self.z2) )
-            colslist.append( fits.Column(name='Z_ERR2', format='E',
-                                         array=self.z_err2) )
-            colslist.append( fits.Column(name='CLASS2', format='%iA' %
-                                         max(list(map(len,self.class2))),
-                                         array=self.class2) )
-            colslist.append( fits.Column(name='SUBCLASS2', format='%iA' %
-                                         max(list(map(len,self.subclass2))),
-                                         array=self.subclass2) )
-            colslist.append( fits.Column(name='FNAME2', format='%iA' %
-                                         max(list(map(len,self.fname2))),
-                                         array=self.fname2) )
-            colslist.append( fits.Column(name='GROUP2', format='J',
-                                         array=self.group2) )
-            colslist.append( fits.Column(name='MINVECTOR2', format='%iA' %
-                                         max(list(map(len,self.minvector2))),
-                                         array=self.minvector2) )
-            colslist.append( fits.Column(name='MINRCHI22', format='E',
-                                         array=self.minrchi22) )
-            colslist.append( fits.Column(name='NPOLY2', format='J',
-                                         array=self.npoly2) )
-            colslist.append( fits.Column(name='NPIXSTEP2', format='J',
-                                         array=self.npixstep2) )
-            colslist.append( fits.Column(name='THETA2', format='%iA' %
-                                         max(list(map(len,self.theta2))),
-                                         array=self.theta2) )
-            colslist.append( fits.Column(name='Z3', format='E', array=self.z3) )
-            colslist.append( fits.Column(name='Z_ERR3', format='E',
-                                         array=self.z_err3) )
-            colslist.append( fits.Column(name='CLASS3', format='%iA' %
-                                         max(list(map(len,self.class3))),
-                                         array=self.class3) )
-            colslist.append( fits.Column(name='SUBCLASS3', format='%iA' %
-                                         max(list(map(len,self.subclass3))),
-                                         array=self.subclass3) )
-            colslist.append( fits.Column(name='FNAME3', format='%iA' %
-                                         max(list(map(len,self.fname3))),
-                                         array=self.fname3) )
-            colslist.append( fits.Column(name='GROUP3', format='J',
-                                         array=self.group3) )
-            colslist.append( fits.Column(name='MINVECTOR3', format='%iA' %
-                                         max(list(map(len,self.minvector3))),
-                                         array=self.minvector3) )
-            colslist.append( fits.Column(name='MINRCHI23', format='E',
-                                         array=self.minrchi23) )
-            colslist.append( fits.Column(name='NPOLY3', format='J',
-                                         array=self.npoly3) )
-            colslist.append( fits.Column(name='NPIXSTEP3', format='J',
-                                         array=self.npixstep3) )
-            colslist.append( fits.Column(name='THETA3', format='%iA' %
-                                         max(list(map(len,self.theta3))),
-                                         array=self.theta3) )
-            colslist.append( fits.Column(name='Z4', format='E', array=self.z4) )
-            colslist.append( fits.Column(name='Z_ERR4', format='E',
-                                         array=self.z_err4) )
-            colslist.append( fits.Column(name='CLASS4', format='%iA' %
-                                         max(list(map(len,self.class4))),
-                                         array=self.class4) )
-            colslist.append( fits.Column(name='SUBCLASS4', format='%iA' %
-                                         max(list(map(len,self.subclass4))),
-                                         array=self.subclass4) )
-            colslist.append( fits.Column(name='FNAME4', format='%iA' %
-                                         max(list(map(len,self.fname4))),
-                                         array=self.fname4) )
-            colslist.append( fits.Column(name='GROUP4', format='J',
-                                         array=self.group4) )
-            colslist.append( fits.Column(name='MINVECTOR4', format='%iA' %
-                                         max(list(map(len,self.minvector4))),
-                                         array=self.minvector4) )
-            colslist.append( fits.Column(name='MINRCHI24', format='E',
-                                         array=self.minrchi24) )
-            colslist.append( fits.Column(name='NPOLY4', format='J',
-                                         array=self.npoly4) )
-            colslist.append( fits.Column(name='NPIXSTEP4', format='J',
-                                         array=self.npixstep4) )
-            colslist.append( fits.Column(name='THETA4', format='%iA' %
-                                         max(list(map(len,self.theta4))),
-                                         array=self.theta4) )
-            colslist.append( fits.Column(name='Z5', format='E', array=self.z5) )
-            colslist.append( fits.Column(name='Z_ERR5', format='E',
-                                         array=self.z_err5) )
-            colslist.append( fits.Column(name='CLASS5', format='%iA' %
-                                         max(list(map(len,self.class5))),
-                                         array=self.class5) )
-            colslist.append( fits.Column(name='SUBCLASS5', format='%iA' %
-                                         max(list(map(len,self.subclass5))),
-                                         array=self.subclass5) )
-            colslist.append( fits.Column(name='FNAME5', format='%iA' %
-                                         max(list(map(len,self.fname5))),
-                                         array=self.fname5) )
-            colslist.append( fits.Column(name='GROUP5', format='J',
-                                         array=self.group5) )
-            colslist.append( fits.Column(name='MINVECTOR5', format='%iA' %
-                                         max(list(map(len,self.minvector5))),
-                                         array=self.minvector5) )
-            colslist.append( fits.Column(name='MINRCHI25', format='E',
-                                         array=self.minrchi25) )
-            colslist.append( fits.Column(name='NPOLY5', format='J',
-                                         array=self.npoly5) )
-            colslist.append( fits.Column(name='NPIXSTEP5', format='J',
-                                         array=self.npixstep5) )
-            colslist.append( fits.Column(name='THETA5', format='%iA' %
-                                         max(list(map(len,self.theta5))),
-                                         array=self.theta5) )
-            colslist.append( fits.Column(name='ZWARNING', format='J',
-                                         array=self.zwarning) )
-            colslist.append( fits.Column(name='RCHI2DIFF', format='E',
-                                         array=self.rchi2diff) )
-            colslist.append( fits.Column(name='CHI2NULL', format='E',
-                                         array=self.chi2_null) )
-            colslist.append( fits.Column(name='SN2DATA', format='E',
-                                         array=self.sn2_data) )
-            cols = fits.ColDefs(colslist)
-            tbhdu = fits.BinTableHDU.from_columns(cols)
+            fields = [('FIBERID', 'J', self.fiberid),
+                      ('DOF', 'J', self.dof),
+                      ('BOSS_TARGET1', 'J', self.boss_target1),
+                      ('EBOSS_TARGET0', 'J', self.eboss_target0),
+                      ('EBOSS_TARGET1', 'J', self.eboss_target1)]
+            for r in range(5):
+                for name, tform, attr, fill in _RANK_COLUMNS:
+                    values = getattr(self, attr)[:,r]
+                    if fill is None:
+                        fields.append( ('%s%d' % (name, r+1), tform, values) )
+                        continue
+                    values, lengths = _pack_vectors(values, fill)
+                    fields += [('%s%d' % (name, r+1), tform, values),
+                               ('N%s%d' % (name, r+1), 'J', lengths)]
+            fields += [('ZWARNING', 'J', self.zwarning),
+                       ('RCHI2DIFF', 'E', self.rchi2diff),
+                       ('CHI2NULL', 'E', self.chi2_null),
+                       ('SN2DATA', 'E', self.sn2_data)]
+            tbhdu = _table_hdu(fields, len(self.fiberid))
             # ImageHDU of models
-            sechdu = fits.ImageHDU(data=self.models)
+            sechdu = _models_hdu(self.models)
             thdulist = fits.HDUList([prihdu, tbhdu, sechdu])
             
             dest = join(topdir, run2d, '%s' % __version__.replace('.', '_'), '%s' % self.plate,
                         'redmonster-%s-%s.fits' % (self.plate, self.mjd))
-            thdulist.writeto( dest, overwrite=True )
+            # The models come from a disk-backed mapping, so stream them
+            # out rather than buffering the whole file in memory
+            _writeto( thdulist, dest, overwrite=True, buffered=False )
 
     def merge_plates2(self):
         self.platelist = []
@@ -1111,52 +1046,30 @@ class MergeRedmonster:
         self.sn2_data = []
         self.plates = []
         self.hdr = fits.Header()
-        try:
-            topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except KeyError:
-            topdir = None
-            print("Environmental variable 'REDMONSTER_SPECTRO_REDUX' is not \
-            set: %r" % e)
-        try:
-            rmver = environ['REDMONSTER_VER']
-        except KeyError:
-            rmver = None
-            print("Environmental variable 'REDMONSTER_VER' is not set: %r" % e)
-        try:
-            run2d = environ['RUN2D']
-        except KeyError:
-            run2d = None
-            print("Environmental variable 'RUN2D' is not set: %r" % e)
-        try:
-            run1d = environ['RUN1D']
-        except KeyError:
-            run1d = None
-            print("Environmental variable 'RUN1D' is not set: %r" % e)
+        topdir = _getenv('REDMONSTER_SPECTRO_REDUX')
+        rmver = _getenv('REDMONSTER_VER')
+        run2d = _getenv('RUN2D')
+        run1d = _getenv('RUN1D')
         platedir = join( topdir, run2d, rmver, '*') if topdir and run2d else None
         if platedir:
             for path in iglob(platedir):
                 self.plates.append( basename(path) )
-            self.plates.sort()
-            for listitem in self.plates:
-                # Ignore any existing redmonsterAll files
-                if listitem[-5:] == '.fits': self.plates.remove(listitem)
+            # Ignore any existing redmonsterAll files
+            self.plates = [plate for plate in sorted(self.plates) if not
+                           plate.endswith('.fits')]
             for plate in self.plates:
                 print('Merging plate %s' % plate)
-                mjds = []
+                mjds = set()
                 try:
                     for x in iglob( join( topdir, run2d, rmver, '%s' % plate,
                                          'redmonster-%s-*.fits' % plate) ):
-                        if len(plate) == 4:
-                            if basename(x)[16:21] not in mjds:
-                                mjds.append(basename(x)[16:21])
-                        elif len(plate) == 5:
-                            if basename(x)[17:22] not in mjds:
-                                mjds.append(basename(x)[17:22])
+                        m = _FILE_RE.match(basename(x))
+                        if m is not None: mjds.add(m.group('mjd'))
                 except Exception as e:
                     mjds = None
                     print("Exception: %r" % e)
-                if mjds is not [] and mjds is not None:
-                    for mjd in mjds:
+                if mjds:
+                    for mjd in sorted(mjds):
                         filepath = join( topdir, run2d, rmver, '%s' % plate,
                                         'redmonster-%s-%s.fits' % (plate, mjd))
                         if exists(filepath):
@@ -1186,17 +1099,19 @@ class MergeRedmonster:
                             self.type += hdu[1].data.CLASS1.tolist()
                             self.subtype += hdu[1].data.SUBCLASS1.tolist()
                             self.fname += hdu[1].data.FNAME1.tolist()
-                            self.minvector += hdu[1].data.MINVECTOR1.tolist()
+                            self.minvector += _unpack_column(hdu[1].data,
+                                                             'MINVECTOR1')
                             self.minrchi2 += hdu[1].data.MINRCHI21.tolist()
                             self.npoly += hdu[1].data.NPOLY1.tolist()
                             self.npixstep += hdu[1].data.NPIXSTEP1.tolist()
-                            self.theta += hdu[1].data.THETA1.tolist()
+                            self.theta += _unpack_column(hdu[1].data,
+                                                         'THETA1')
                             self.zwarning += hdu[1].data.ZWARNING.tolist()
                             self.rchi2diff += hdu[1].data.RCHI2DIFF.tolist()
                             self.chi2_null += hdu[1].data.CHI2NULL.tolist()
                             self.sn2_data += hdu[1].data.SN2DATA.tolist()
             self.hdr.extend([
-                             ('SPEC2D',environ['RUN2D'],
+                             ('SPEC2D',run2d,
                               'Version of spec2d reductions used'),
                              ('VERS_RM',rmver,'Version of redmonster used'),
                              ('TIME',strftime("%Y-%m-%d_%H:%M:%S", gmtime()),
@@ -1232,27 +1147,26 @@ class MergeRedmonster:
             colslist.append( fits.Column(name='Z', format='E', array=self.z) )
             colslist.append( fits.Column(name='Z_ERR', format='E',
                                          array=self.z_err) )
-            colslist.append( fits.Column(name='CLASS', format='%iA' %
-                                         max(list(map(len,self.type))),
-                                         array=self.type) )
-            colslist.append( fits.Column(name='SUBCLASS', format='%iA' %
-                                         max(list(map(len,self.subtype))),
-                                         array=self.subtype) )
-            colslist.append( fits.Column(name='FNAME', format='%iA' %
-                                         max(list(map(len,self.fname))),
-                                         array=self.fname) )
-            colslist.append( fits.Column(name='MINVECTOR', format='%iA' %
-                                         max(list(map(len,self.minvector))),
-                                         array=self.minvector) )
+            colslist.append( _str_col('CLASS', self.type) )
+            colslist.append( _str_col('SUBCLASS', self.subtype) )
+            colslist.append( _str_col('FNAME', self.fname) )
+            minvector, nminvector = _pack_vectors(self.minvector, -1)
+            colslist.append( fits.Column(name='MINVECTOR', format='%iJ' %
+                                         minvector.shape[1],
+                                         array=minvector) )
+            colslist.append( fits.Column(name='NMINVECTOR', format='J',
+                                         array=nminvector) )
             colslist.append( fits.Column(name='MINRCHI2', format='E',
                                          array=self.minrchi2) )
             colslist.append( fits.Column(name='NPOLY', format='J',
                                          array=self.npoly) )
             colslist.append( fits.Column(name='NPIXSTEP', format='J',
                                          array=self.npixstep) )
-            colslist.append( fits.Column(name='THETA', format='%iA' %
-                                         max(list(map(len,self.theta))),
-                                         array=self.theta) )
+            theta, ntheta = _pack_vectors(self.theta, n.nan)
+            colslist.append( fits.Column(name='THETA', format='%iD' %
+                                         theta.shape[1], array=theta) )
+            colslist.append( fits.Column(name='NTHETA', format='J',
+                                         array=ntheta) )
             colslist.append( fits.Column(name='ZWARNING', format='J',
                                          array=self.zwarning) )
             colslist.append( fits.Column(name='RCHI2DIFF', format='E',
@@ -1267,66 +1181,65 @@ class MergeRedmonster:
             thdulist = fits.HDUList([prihdu, tbhdu])
             
             dest = join(topdir, run2d, rmver, 'redmonsterAll-%s.fits' % run1d)
-            thdulist.writeto( dest, overwrite=True )
+            _writeto( thdulist, dest, overwrite=True )
 
     def merge_chi2(self):
-        try:
-            topdir = environ['REDMONSTER_SPECTRO_REDUX']
-        except KeyError:
-            topdir = None
-            print("'REDMONSTER_SPECTRO_REDUX' env variable not set.")
-        try:
-            rmver = environ['REDMONSTER_VER']
-        except KeyError:
-            rmver = None
-            print("Environmental variable 'REDMONSTER_VER' is not set: %r" % e)
-        try:
-            run2d = environ['RUN2D']
-        except KeyError:
-            run2d = None
-            print("'RUN1D' env variable not set.")
-        try:
-            run1d = environ['RUN1D']
-        except KeyError:
-            run1d = None
-            print("'RUN1D' env variable not set.")
-        chi2path = join( topdir, run2d, rmver, '%s' % self.plate,
-                        'chi2arr-%s-%s-%s-*.fits' %
-                        (self.temp, self.plate, self.mjd) ) if topdir and \
-                                run2d and run1d else None
+        if self.chi2dir is None:
+            print("Environmental variables %s and a plate are needed to "
+                  "merge chi2 files" % ', '.join(_CHI2DIR_ENV))
+            return
+        prefix = 'chi2arr-%s-%s-%s-' % (self.temp, self.plate, self.mjd)
         
         fiberid = []
         paths = []
         
-        if chi2path:
-            for file in iglob(chi2path):
-                paths.append( file )
-                m = re.search( 'chi2arr-%s-%s-%s-(\d+).fits' %
-                              (self.temp, self.plate, self.mjd), basename(file))
-                if m.group(1): fiberid.append( int(m.group(1)) )
-            fiberid.sort()
-            paths.sort()
-            
-            for i,path in enumerate(paths):
-                chi2arr = fits.open(path)[0].data
-                try:
-                    chi2arrs
-                except NameError:
-                    chi2arrs = n.zeros( (len(fiberid),) + chi2arr.shape[1:] )
-                    chi2arrs[i] = chi2arr
-                else:
-                    chi2arrs[i] = chi2arr
-                remove(path)
+        # One pass over the directory, matching names by prefix/suffix
+        for entry in scandir(self.chi2dir):
+            if not (entry.name.startswith(prefix) and
+                    entry.name.endswith('.fits')): continue
+            fiber = entry.name[len(prefix):-len('.fits')]
+            if not fiber.isdigit(): continue
+            paths.append( entry.path )
+            fiberid.append( int(fiber) )
+        if not paths:
+            print('No chi2 files found for template %s, plate %s, mjd %s' %
+                  (self.temp, self.plate, self.mjd))
+            return
+        fiberid, paths = _by_fiberid(fiberid, paths)
+        
+        # The first file fixes the shape and dtype of the merged array,
+        # and the layout the others were written with, so only its
+        # header is parsed; $REDMONSTER_FLOAT32_CHI2 stores the array in
+        # single precision.  The data are read straight into their rows
+        # of the one allocation, rather than read whole and stacked.
+        layout = _chi2_layout(paths[0])
+        dtype = n.float32 if environ.get('REDMONSTER_FLOAT32_CHI2') else \
+                layout[2]
+        chi2arrs = _scratch_array( (len(fiberid),) + layout[3][1:],
+                                  dtype=dtype )
+        # The reads are latency- rather than CPU-bound, so overlap them
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(_pread_chi2arr, paths, chi2arrs,
+                          repeat(layout)))
 
-            prihdu = fits.PrimaryHDU(chi2arrs)
-            col1 = fits.Column(name='FIBERID', format='J', array=fiberid)
-            cols = fits.ColDefs([col1])
-            tbhdu = fits.BinTableHDU.from_columns(cols)
-            thdulist = fits.HDUList([prihdu,tbhdu])
-            thdulist.writeto( join( topdir, run2d, rmver, '%s' % self.plate,
-                                   'chi2arr-%s-%s-%s.fits' %
-                                   (self.temp, self.plate, self.mjd) ),
-                             overwrite=True)
+        prihdu = fits.PrimaryHDU(chi2arrs)
+        col1 = fits.Column(name='FIBERID', format='J',
+                           array=n.asarray(fiberid, dtype='>i4'))
+        cols = fits.ColDefs([col1])
+        tbhdu = fits.BinTableHDU.from_columns(cols)
+        thdulist = fits.HDUList([prihdu,tbhdu])
+        dest = join( self.chi2dir, 'chi2arr-%s-%s-%s.fits' %
+                    (self.temp, self.plate, self.mjd) )
+        # The HDUs are built here, so there is nothing to verify, and
+        # the cube is streamed from its mapping rather than buffered
+        _writeto( thdulist, dest, overwrite=True, output_verify='ignore',
+                 buffered=False )
+        if environ.get('REDMONSTER_CHI2_HDF5') and _HAS_H5PY:
+            _write_chi2_hdf5( splitext(dest)[0] + '.h5', chi2arrs,
+                             fiberid )
+        # Only delete the fiber files once the merged file is written
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(remove, paths))
 
 
 # ------------------------------------------------------------------------------
@@ -14,6 +14,7 @@ from time import gmtime, strftime
 from glob import iglob
 
 from redmonster.datamgr import io2
+from redmonster._version import __version__
 
 
 try:
@@ -31,7 +32,8 @@ try:
 except KeyError as e:
     run1d = None
     print("Environmental variable 'RUN1D' is not set: %r" % e)
-platedir = join( topdir, run2d, '*') if topdir and run2d else None
+platedir = join( topdir, run2d, '%s' % __version__.replace('.', '_'), '*') \
+        if topdir and run2d else None
 
 plates = []
 
@@ -54,13 +56,14 @@ if platedir:
             print("Exception: %r" % e)
         for mjd in mjds:
             temps = []
+            chi2_re = re.compile(r'chi2arr-(\D+)-%s-%s-\d+\.fits' %
+                                 (re.escape(plate), re.escape(mjd)))
             for x in iglob( join( topdir, run2d, '%s' % __version__.replace('.', '_'), str(plate),
                                  'chi2arr-*-%s-%s-*.fits' % (plate,mjd)) ):
-                m = re.search(r'chi2arr-(\D+)-%s-%s-\d+.fits' % (plate,mjd),
-                              basename(x))
+                m = chi2_re.search(basename(x))
                 if m.group(1) not in temps: temps.append(m.group(1))
             for temp in temps:
                 print('Merging chi2 files for plate %s, mjd %s, template %s' % \
                         (plate, mjd, temp))
-                x = io.MergeRedmonster(plate, mjd, temp)
+                x = io2.MergeRedmonster(plate, mjd, temp)
                 x.merge_chi2()
\ No newline at end of file